@@ -1,18 +1,25 @@
 import argparse
+import functools
 import hashlib
 import json
-
-from jsonschema import validate
 import logging
 from pathlib import Path
 import uuid
 from sys import stdout
 
+from analysis.batch_fitness import BatchFitnessEvaluator
 from analysis.fitness_functions import FitnessFunctions
+from optimization.checkpoint import Checkpointer
 from optimization.ga import GA, ParallelGA
-from optimization.sgd import SGD
+from optimization.operators import CROSSOVERS, INTEREST_AREAS
+from optimization.islands import IslandGA, TOPOLOGIES
+from optimization.sgd import COOLING_SCHEDULES, EXPONENTIAL, SGD
+from optimization.snapshots import SnapshotLog
 from optimization.statistics import GAStatistics
+from optimization.termination import Termination
+from optimization.sweep import get_sweep_jobs, load_sweep, run_sweep
 from network.interest_areas import InterestAreaGenerator
+from utils.metrics import MetricsRecorder
 from utils.utils import timer, save_statistics, save_network_image, str2bool
 
 formatter = logging.Formatter('%(asctime)s %(levelname)s: %(message)s')
@@ -27,8 +34,8 @@ def main():
     parser = argparse.ArgumentParser(description='Create an optimized adhoc sensor network')
     parser.add_argument('--interest-areas', dest='interest_areas', required=True,
                         help='a path to the interest areas json file')
-    parser.add_argument('--fitness-function', dest='fitness_function', required=True, type=int,
-                        help='1 (sum square cc size)  or 3 (harmonic avg path length)')
+    parser.add_argument('--fitness-function', dest='fitness_function', required=False, type=int,
+                        help='1 (sum square cc size)  or 3 (harmonic avg path length). required unless running a sweep')
     parser.add_argument('--output-base-dir', dest='output_dir', required=True,
                         help='The GA process output folder path. (process visualization and result)')
     parser.add_argument('--iterations', dest='iterations', required=False, type=int, default=300,
@@ -37,62 +44,248 @@ def main():
                         help='The size of the initial population for the GA')
     parser.add_argument('--mutation-factor', dest='mutation_factor', required=False, type=float, default=1,
                         help='The probability of mutation')
+    parser.add_argument('--crossover', dest='crossover', required=False, default=INTEREST_AREAS, choices=CROSSOVERS,
+                        help='How offsprings inherit the sensors of their parents')
+    parser.add_argument('--mutation-sensors', dest='mutation_sensors', required=False, type=int, default=1,
+                        help='The amount of sensors a mutation moves')
+    parser.add_argument('--mutation-step', dest='mutation_step', required=False, type=float, default=0.5,
+                        help='The standard deviation of the mutation steps as a fraction of the interest areas radii')
+    parser.add_argument('--stop-at-optimum', dest='stop_at_optimum', required=False, type=str2bool, default=True,
+                        help='Stop the GA once the fittest network reaches the best fitness the interest areas allow')
+    parser.add_argument('--stagnation-window', dest='stagnation_window', required=False, type=int, default=0,
+                        help='Stop the GA after this amount of generations without an improvement (0 never stops)')
+    parser.add_argument('--adaptation-window', dest='adaptation_window', required=False, type=int, default=0,
+                        help='Double the mutation step and grow the population after every this amount of generations '
+                             'without an improvement (0 never adapts)')
+    parser.add_argument('--stagnation-tolerance', dest='stagnation_tolerance', required=False, type=float, default=0.0,
+                        help='The relative change of the best fitness that is not considered an improvement')
+    parser.add_argument('--max-population', dest='max_population', required=False, type=int, default=None,
+                        help='The maximal population size of the adaptations (defaults to four times the initial population)')
     parser.add_argument('--visualize', dest='visualize', required=False, type=str2bool, default=False,
                         help='How many processes to spawn for parallel calculation')
+    parser.add_argument('--frame-step', dest='frame_step', required=False, type=int, default=1,
+                        help='Visualize only every frame-step generation')
+    parser.add_argument('--visualization-format', dest='visualization_format', required=False, default='gif',
+                        choices=['gif', 'mp4'], help='The format of the evolution visualization (mp4 needs imageio-ffmpeg)')
+    parser.add_argument('--render-processes', dest='render_processes', required=False, type=int, default=2,
+                        help='How many processes render the visualization snapshots while evolving')
+    parser.add_argument('--save-snapshots', dest='save_snapshots', required=False, type=str2bool, default=False,
+                        help='Save every visualization snapshot as a png in the snapshots folder')
     parser.add_argument('--parallel', dest='parallel', required=False, type=str2bool, default=False,
                         help='How many processes to spawn for parallel calculation')
     parser.add_argument('--optimization-method', dest='optimization_method', required=False, default='ga')
+    parser.add_argument('--sgd-batch-size', dest='sgd_batch_size', required=False, type=int, default=8,
+                        help='The amount of candidate networks the SGD evaluates every iteration')
+    parser.add_argument('--sgd-step-size', dest='sgd_step_size', required=False, type=float, default=0.25,
+                        help='The standard deviation of the SGD sensors steps as a fraction of their interest areas radii')
+    parser.add_argument('--temperature', dest='temperature', required=False, type=float, default=1.0,
+                        help='The initial temperature of the SGD simulated annealing')
+    parser.add_argument('--cooling-schedule', dest='cooling_schedule', required=False, default=EXPONENTIAL,
+                        choices=COOLING_SCHEDULES, help='How the SGD temperature cools down')
+    parser.add_argument('--cooling-rate', dest='cooling_rate', required=False, type=float, default=0.99,
+                        help='The cooling rate of the exponential cooling schedule')
+    parser.add_argument('--evaluation-backend', dest='evaluation_backend', required=False, default='objects',
+                        choices=['objects', 'batch'],
+                        help='objects (evaluate every network graph) or batch (vectorized evaluation of the whole population)')
+    parser.add_argument('--parallel-components', dest='parallel_components', required=False, type=str2bool, default=False,
+                        help='Run the path length BFS of the harmonic fitness function on multiple processes (for very large networks)')
+    parser.add_argument('--fitness-cache-size', dest='fitness_cache_size', required=False, type=int, default=1024,
+                        help='The amount of fitness values the GA remembers. 0 disables the cache')
+    parser.add_argument('--sweep', dest='sweep', required=False, default=None,
+                        help='A json sweep spec of seeds, fitness functions, population sizes and mutation factors. '
+                             'Runs a GA for every combination on one pool and writes a results table')
+    parser.add_argument('--sweep-processes', dest='sweep_processes', required=False, type=int, default=None,
+                        help='How many runs of a sweep run concurrently (defaults to the cpu count)')
+    parser.add_argument('--islands', dest='islands', required=False, type=int, default=0,
+                        help='The amount of GA islands (processes) of an island model GA. 0 disables the island model')
+    parser.add_argument('--migration-interval', dest='migration_interval', required=False, type=int, default=10,
+                        help='The amount of generations between migrations of the island model GA')
+    parser.add_argument('--migration-size', dest='migration_size', required=False, type=int, default=1,
+                        help='The amount of best agents every island sends on migration')
+    parser.add_argument('--migration-topology', dest='migration_topology', required=False, default='ring', choices=TOPOLOGIES,
+                        help='ring (every island sends to the next one) or random')
+    parser.add_argument('--checkpoint-interval', dest='checkpoint_interval', required=False, type=int, default=10,
+                        help='The amount of generations between checkpoints of the GA state. 0 disables checkpoints')
+    parser.add_argument('--resume', dest='resume', required=False, default=None,
+                        help='The run id of a stopped GA run (in the output base dir) to resume from its last checkpoint')
+    parser.add_argument('--metrics-format', dest='metrics_format', required=False, default='jsonl', choices=['jsonl', 'csv'],
+                        help='The format of the per phase performance metrics file written to the run directory')
+    parser.add_argument('--trace-memory', dest='trace_memory', required=False, type=str2bool, default=False,
+                        help='Record the peak python memory of every phase with tracemalloc (slows the process down)')
 
     args = parser.parse_args()
+    if args.fitness_function is None and not args.sweep:
+        parser.error('--fitness-function is required unless running a sweep')
 
     logger.info('validating and loading interest areas from %s', args.interest_areas)
     interest_areas = load_interest_areas(args.interest_areas)
+    if args.sweep:
+        run_sweep_mode(args, interest_areas)
+        return
     fitness_function = FitnessFunctions.get_fitness_function(args.fitness_function)
-    run_id = '{}_{}'.format(args.fitness_function, hashlib.sha256(str(uuid.uuid4()).encode()).hexdigest()[:8])
+    run_id = args.resume or '{}_{}'.format(args.fitness_function, hashlib.sha256(str(uuid.uuid4()).encode()).hexdigest()[:8])
+    components_pool = None
+    if args.parallel_components and args.fitness_function == FitnessFunctions.HARMONIC_AVG_PATH_LENGTH:
+        if args.parallel:
+            logger.warning('--parallel-components is ignored when running with --parallel')
+        else:
+            from multiprocessing.pool import Pool
+            components_pool = Pool()
+            fitness_function = functools.partial(fitness_function, pool=components_pool)
+    metrics_recorder = MetricsRecorder(run_id=run_id, trace_memory=args.trace_memory)
+    batch_evaluator = None
+    if args.evaluation_backend == 'batch':
+        batch_evaluator = BatchFitnessEvaluator(fitness_function=args.fitness_function)
 
     if args.optimization_method == 'ga':
-        logger.info('creating initial population of size %s', args.initial_population)
-        with timer(op_name='evolution', logger=logger):
-            if args.parallel:
-                logger.info("starting GA process (%s) asynchronously", run_id)
-                from multiprocessing.pool import Pool
-                with Pool() as pool:
-                    ga = ParallelGA(interest_areas=interest_areas, initial_population_size=args.initial_population,
-                                    generations=args.iterations, fitness_function=fitness_function,
-                                    optimum=FitnessFunctions.get_fitness_function_optimum(args.fitness_function), pool=pool,
-                                    mutation_factor=args.mutation_factor, run_id=run_id)
-                    ga.generate_initial_population()
-                    ga.evolve(logger=logger)
+        run_dir = '{}/{}'.format(args.output_dir, run_id)
+        Path(run_dir).mkdir(parents=True, exist_ok=True)
+        snapshot_log = SnapshotLog(path='{}/snapshots.bin'.format(run_dir))
+        render_pool = None
+        renderer = None
+        try:
+            checkpoint_path = '{}/checkpoint.npz'.format(run_dir)
+            checkpoint = None
+            if args.resume:
+                if not Path(checkpoint_path).exists():
+                    logger.error('No checkpoint was found in %s', run_dir)
+                    return
+                logger.info('loading checkpoint %s', checkpoint_path)
+                checkpoint = Checkpointer.load(checkpoint_path)
+                snapshot_log.discard_after(int(checkpoint['generation']))
+            checkpointer = None
+            if args.checkpoint_interval:
+                if args.islands:
+                    logger.warning('checkpoints are not supported with --islands')
+                else:
+                    checkpointer = Checkpointer(path=checkpoint_path, interval=args.checkpoint_interval)
+            if args.visualize:
+                from optimization.parallel import create_pool
+                from optimization.visualization import EvolutionRenderer
+                snapshots_dir = '{}/snapshots'.format(run_dir) if args.save_snapshots else None
+                if snapshots_dir:
+                    Path(snapshots_dir).mkdir(parents=True, exist_ok=True)
+                render_pool = create_pool(interest_areas=interest_areas, processes=args.render_processes)
+                renderer = EvolutionRenderer(pool=render_pool, path='{}/network_evolution.{}'.format(run_dir, args.visualization_format),
+                                             frame_step=args.frame_step, snapshots_dir=snapshots_dir)
+            termination = None
+            if args.islands:
+                if args.stagnation_window or args.adaptation_window:
+                    logger.warning('--stagnation-window and --adaptation-window are ignored when running with --islands')
             else:
-                logger.info("starting GA process (%s) synchronously", run_id)
-                ga = GA(interest_areas=interest_areas, initial_population_size=args.initial_population,
-                        generations=args.iterations, fitness_function=fitness_function,
-                        optimum=FitnessFunctions.get_fitness_function_optimum(args.fitness_function),
-                        mutation_factor=args.mutation_factor, run_id=run_id)
+                termination = create_termination(args, interest_areas)
+            logger.info('creating initial population of size %s', args.initial_population)
+            with timer(op_name='evolution', logger=logger):
+                if args.islands:
+                    if checkpoint:
+                        logger.error('island GA runs can not be resumed')
+                        return
+                    if args.parallel:
+                        logger.warning('--parallel is ignored when running with --islands')
+                    logger.info("starting island GA process (%s) with %s islands", run_id, args.islands)
+                    ga = IslandGA(interest_areas=interest_areas, initial_population_size=args.initial_population,
+                                  generations=args.iterations, fitness_function=fitness_function,
+                                  optimum=FitnessFunctions.get_fitness_function_optimum(args.fitness_function),
+                                  islands=args.islands, migration_interval=args.migration_interval,
+                                  migration_size=args.migration_size, migration_topology=args.migration_topology,
+                                  mutation_factor=args.mutation_factor, run_id=run_id, batch_evaluator=batch_evaluator,
+                                  fitness_cache_size=args.fitness_cache_size, metrics_recorder=metrics_recorder,
+                                  renderer=renderer, snapshot_log=snapshot_log, crossover=args.crossover,
+                                  mutation_sensors=args.mutation_sensors, mutation_step=args.mutation_step)
+                    ga.generate_initial_population(logger_name=logger.name)
+                    ga.evolve(logger=logger)
+                elif args.parallel:
+                    logger.info("starting GA process (%s) asynchronously", run_id)
+                    from optimization.parallel import create_pool
+                    with create_pool(interest_areas=interest_areas) as pool:
+                        ga = ParallelGA(interest_areas=interest_areas, initial_population_size=args.initial_population,
+                                        generations=args.iterations, fitness_function=fitness_function,
+                                        optimum=FitnessFunctions.get_fitness_function_optimum(args.fitness_function), pool=pool,
+                                        mutation_factor=args.mutation_factor, run_id=run_id, batch_evaluator=batch_evaluator,
+                                        fitness_cache_size=args.fitness_cache_size, metrics_recorder=metrics_recorder,
+                                        renderer=renderer, snapshot_log=snapshot_log, checkpointer=checkpointer,
+                                        crossover=args.crossover, mutation_sensors=args.mutation_sensors, mutation_step=args.mutation_step,
+                                        termination=termination)
+                        initialize_population(ga, checkpoint=checkpoint)
+                        ga.evolve(logger=logger)
+                else:
+                    logger.info("starting GA process (%s) synchronously", run_id)
+                    ga = GA(interest_areas=interest_areas, initial_population_size=args.initial_population,
+                            generations=args.iterations, fitness_function=fitness_function,
+                            optimum=FitnessFunctions.get_fitness_function_optimum(args.fitness_function),
+                            mutation_factor=args.mutation_factor, run_id=run_id, batch_evaluator=batch_evaluator,
+                            fitness_cache_size=args.fitness_cache_size, metrics_recorder=metrics_recorder,
+                            renderer=renderer, snapshot_log=snapshot_log, checkpointer=checkpointer,
+                            crossover=args.crossover, mutation_sensors=args.mutation_sensors, mutation_step=args.mutation_step,
+                            termination=termination)
 
-                ga.generate_initial_population()
-                ga.evolve(logger=logger)
+                    initialize_population(ga, checkpoint=checkpoint)
+                    ga.evolve(logger=logger)
 
-        create_ga_process_files(process=ga, output_dir=args.output_dir, visualize_ga=args.visualize)
+            create_ga_process_files(process=ga, output_dir=args.output_dir, visualize_ga=args.visualize,
+                                    metrics_format=args.metrics_format)
+        finally:
+            # also reached when the GA fails or can not be resumed, so the pool workers and files are released
+            snapshot_log.close()
+            if renderer:
+                renderer.writer.close()
+            if render_pool:
+                render_pool.close()
+                render_pool.join()
     elif args.optimization_method == 'sgd':
         sgd = SGD(run_id=run_id, interest_areas=interest_areas, fitness_function=fitness_function,
-                  optimum=FitnessFunctions.get_fitness_function_optimum(args.fitness_function), iterations=args.iterations)
+                  optimum=FitnessFunctions.get_fitness_function_optimum(args.fitness_function), iterations=args.iterations,
+                  metrics_recorder=metrics_recorder, batch_evaluator=batch_evaluator, batch_size=args.sgd_batch_size,
+                  step_size=args.sgd_step_size, temperature=args.temperature, cooling_schedule=args.cooling_schedule,
+                  cooling_rate=args.cooling_rate)
         sgd.evolve(logger=logger)
-        create_ga_process_files(process=sgd, output_dir=args.output_dir, visualize_ga=args.visualize)
+        create_ga_process_files(process=sgd, output_dir=args.output_dir, visualize_ga=args.visualize,
+                                metrics_format=args.metrics_format)
     else:
         logger.error('Unknown optimization method %s. Please use GA or SGD', args.optimization_method)
+    if components_pool:
+        components_pool.close()
     logger.info('Finished optimization process')
 
 
+def run_sweep_mode(args, interest_areas):
+    sweep = load_sweep(args.sweep)
+    sweep_id = 'sweep_{}'.format(hashlib.sha256(str(uuid.uuid4()).encode()).hexdigest()[:8])
+    jobs = get_sweep_jobs(sweep, sweep_id=sweep_id, iterations=args.iterations, evaluation_backend=args.evaluation_backend,
+                          fitness_cache_size=args.fitness_cache_size)
+    sweep_dir = '{}/{}'.format(args.output_dir, sweep_id)
+    Path(sweep_dir).mkdir(parents=True, exist_ok=True)
+    with open('{}/sweep.json'.format(sweep_dir), 'w') as sweep_file:
+        sweep_file.write(json.dumps(sweep))
+    logger.info('starting sweep %s of %s runs', sweep_id, len(jobs))
+    from optimization.parallel import create_pool
+    with timer(op_name='sweep', logger=logger), create_pool(interest_areas=interest_areas, processes=args.sweep_processes) as pool:
+        run_sweep(pool, jobs, path='{}/sweep_results.csv'.format(sweep_dir), logger=logger)
+    logger.info('Finished sweep, results are in %s/sweep_results.csv', sweep_dir)
+
+
+def create_termination(args, interest_areas):
+    bound = None
+    if args.stop_at_optimum:
+        bound = FitnessFunctions.get_fitness_function_bound(args.fitness_function, interest_areas)
+        logger.info('the best fitness of the interest areas is %s', bound)
+    return Termination(optimum=FitnessFunctions.get_fitness_function_optimum(args.fitness_function), bound=bound,
+                       stagnation_window=args.stagnation_window, adaptation_window=args.adaptation_window,
+                       tolerance=args.stagnation_tolerance, max_population_size=args.max_population)
+
+
+def initialize_population(ga, checkpoint=None):
+    if checkpoint:
+        Checkpointer.restore(ga, checkpoint)
+    else:
+        ga.generate_initial_population()
+
+
 def load_interest_areas(interest_areas_definition):
-    with open(interest_areas_definition, 'r') as interes_areas_file, open('schemas/interest_areas_schema.json', 'r') as interest_areas_schema_file:
-        interest_areas_json = json.loads(interes_areas_file.read())
-        interest_areas_schema = json.loads(interest_areas_schema_file.read())
-        validate(interest_areas_json, interest_areas_schema)
-    return InterestAreaGenerator.from_file(interest_areas_definition)
+    return InterestAreaGenerator.from_file(interest_areas_definition, validate=True)
 
 
-def create_ga_process_files(process, output_dir, visualize_ga=False):
+def create_ga_process_files(process, output_dir, visualize_ga=False, metrics_format='jsonl'):
     logger.info('creating optimization process files')
     Path('{}/{}'.format(output_dir, process.run_id)).mkdir(parents=True, exist_ok=True)
     fittest_network = process.get_fittest().network
@@ -103,15 +296,26 @@ def create_ga_process_files(process, output_dir, visualize_ga=False):
             'connectivity_components_amount': len(fittest_network.graph.get_connectivity_components()),
             'size_of_largest_component': max([len(cc) for cc in fittest_network.graph.get_connectivity_components()]),
         }
+        if process.statistics and process.statistics.stop:
+            network_info['stop_generation'], network_info['stop_reason'] = process.statistics.stop
         network_info_file.write(json.dumps(network_info))
     if process.statistics:
         logger.info("creating statistics visualization")
         save_statistics(GAStatistics.GEN_FITNESS, process.statistics.get(GAStatistics.GEN_FITNESS),
                         path='{}/{}/{}.png'.format(output_dir, process.run_id, GAStatistics.GEN_FITNESS))
+        if process.statistics.get(GAStatistics.GEN_FITNESS_CACHE_HIT_RATE):
+            save_statistics(GAStatistics.GEN_FITNESS_CACHE_HIT_RATE, process.statistics.get(GAStatistics.GEN_FITNESS_CACHE_HIT_RATE),
+                            path='{}/{}/{}.png'.format(output_dir, process.run_id, GAStatistics.GEN_FITNESS_CACHE_HIT_RATE))
+        for name in (GAStatistics.GEN_MUTATION_STEP, GAStatistics.GEN_POPULATION_SIZE):
+            if process.statistics.get(name):
+                save_statistics(name, process.statistics.get(name), path='{}/{}/{}.png'.format(output_dir, process.run_id, name))
     if visualize_ga:
-        Path('{}/{}/snapshots'.format(output_dir, process.run_id)).mkdir(parents=True, exist_ok=True)
+        if not getattr(process, 'renderer', None):
+            Path('{}/{}/snapshots'.format(output_dir, process.run_id)).mkdir(parents=True, exist_ok=True)
         logger.info('creating optimization visualization')
-        process.generate_evolution_visualization(network_image_saver=save_network_image, output_dir=output_dir)
+        with process.metrics.measure('visualization'):
+            process.generate_evolution_visualization(network_image_saver=save_network_image, output_dir=output_dir)
+    process.metrics.save('{}/{}/metrics.{}'.format(output_dir, process.run_id, metrics_format))
 
 
 if __name__ == '__main__':
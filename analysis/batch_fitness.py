@@ -0,0 +1,104 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+from analysis.fitness_functions import FitnessFunctions
+from graphs.paths import reciprocal_hop_distances_sum
+
+
+class BatchFitnessEvaluator(object):
+    """
+    Evaluates the built in fitness functions for a whole population at once.
+    The population is given as an array of sensors coordinates of shape (agents, sensors, 2). Networks with less
+    sensors than others are padded and masked out with the valid mask.
+    """
+
+    def __init__(self, fitness_function, radius=1):
+        """
+        :param fitness_function: the fitness function id (see FitnessFunctions)
+        :param radius: the disk graph radius
+        """
+        if fitness_function not in (FitnessFunctions.SUM_SQUARE_CC_SIZE, FitnessFunctions.HARMONIC_AVG_PATH_LENGTH):
+            raise ValueError('No batch evaluation for fitness function {}'.format(fitness_function))
+        self.fitness_function = fitness_function
+        self.radius = radius
+
+    @staticmethod
+    def pack(networks):
+        """
+        :param networks: a list of ADGN objects
+        :return: a tuple (coordinates, valid, relays) of shapes (agents, sensors, 2), (agents, sensors), (agents, sensors)
+        """
+        size = max(len(network.sensors) for network in networks)
+        coordinates = np.zeros(shape=(len(networks), size, 2), dtype=float)
+        valid = np.zeros(shape=(len(networks), size), dtype=bool)
+        relays = np.zeros(shape=(len(networks), size), dtype=bool)
+        for i, network in enumerate(networks):
+            sensors = network.sensors
+            coordinates[i, :len(sensors)] = sensors.locations[:len(sensors)]
+            valid[i, :len(sensors)] = [sensor in network.graph.vertices for sensor in sensors.sensors]
+            relays[i, :len(sensors)] = sensors.relays[:len(sensors)]
+        return coordinates, valid, relays
+
+    def evaluate_networks(self, networks):
+        return self.evaluate(*self.pack(networks=networks))
+
+    def evaluate(self, coordinates, valid=None, relays=None):
+        """
+        :param coordinates: an array of shape (agents, sensors, 2)
+        :param valid: (optional) a boolean array of shape (agents, sensors). False entries are padding
+        :param relays: (optional) a boolean array of shape (agents, sensors). True entries are relays
+        :return: an array of shape (agents,) with the fitness of every agent
+        """
+        coordinates = np.asarray(coordinates, dtype=float)
+        agents, size = coordinates.shape[:2]
+        valid = np.ones(shape=(agents, size), dtype=bool) if valid is None else np.asarray(valid, dtype=bool)
+        relays = np.zeros(shape=(agents, size), dtype=bool) if relays is None else np.asarray(relays, dtype=bool)
+        graph = self.get_adjacency(coordinates, valid)
+        _, labels = connected_components(graph, directed=False)
+        labels = labels.reshape(agents, size)
+        if self.fitness_function == FitnessFunctions.SUM_SQUARE_CC_SIZE:
+            return self.sum_square_cc_size(labels, valid)
+        return self.harmonic_avg_path_length(graph, labels, valid, relays)
+
+    def get_adjacency(self, coordinates, valid):
+        """
+        Builds the disk graphs of all the agents as a single block diagonal sparse graph.
+        The vertex of sensor j of agent i is i * sensors + j
+        :return: a scipy csr matrix of shape (agents * sensors, agents * sensors)
+        """
+        agents, size = coordinates.shape[:2]
+        rows = []
+        columns = []
+        for agent in range(agents):
+            indices = np.flatnonzero(valid[agent])
+            pairs = cKDTree(coordinates[agent, indices]).query_pairs(r=self.radius, output_type='ndarray')
+            rows.append(indices[pairs[:, 0]] + agent * size)
+            columns.append(indices[pairs[:, 1]] + agent * size)
+        rows = np.concatenate(rows)
+        columns = np.concatenate(columns)
+        return csr_matrix((np.ones(2 * len(rows), dtype=np.int8), (np.concatenate([rows, columns]), np.concatenate([columns, rows]))),
+                          shape=(agents * size, agents * size))
+
+    @staticmethod
+    def sum_square_cc_size(labels, valid):
+        sizes = np.bincount(labels[valid], minlength=labels.size)
+        label_agents = np.zeros(shape=labels.size, dtype=int)
+        label_agents[labels.ravel()] = np.repeat(np.arange(labels.shape[0]), labels.shape[1])
+        return np.bincount(label_agents, weights=sizes ** 2, minlength=labels.shape[0])
+
+    @staticmethod
+    def harmonic_avg_path_length(graph, labels, valid, relays):
+        agents, size = labels.shape
+        fitness = np.zeros(shape=agents, dtype=float)
+        for agent in range(agents):
+            n = np.count_nonzero(valid[agent])
+            if len(np.unique(labels[agent][valid[agent]])) == n:
+                continue
+            sensors = np.flatnonzero(valid[agent] & ~relays[agent])
+            rows, columns = graph[agent * size:(agent + 1) * size, agent * size:(agent + 1) * size].nonzero()
+            distance_sum = reciprocal_hop_distances_sum(size, rows, columns, sources=sensors, targets=sensors) / 2
+            if distance_sum > 0:
+                fitness[agent] = ((n * (n - 1)) / 2) / distance_sum
+        return fitness
@@ -1,5 +1,9 @@
 import itertools
 
+import numpy as np
+
+from graphs.paths import reciprocal_hop_distances_sum
+from network.interest_areas import get_reachable_components
 from optimization.ga import Agent
 
 
@@ -9,28 +13,58 @@ def sum_square_connectivity_componenet_fitness_function(agent):
     else:
         network = agent.network
         agent_id = agent.agent_id
-    return agent_id, sum(map(lambda cc: len(cc) ** 2, network.graph.get_connectivity_components()))
+    return agent_id, network.graph.get_sum_square_connectivity_components_sizes()
+
+
+HARMONIC_SOURCES_CHUNK_SIZE = 256
+
 
+def harmonic_sums_on_paths_length(network, ccs, pool=None):
+    """
+    Computes the sum of the reciprocal path lengths between all the pairs of sensors (relays excluded) of every
+    connectivity component with a single BFS per sensor. The BFS sources are split into chunks which run on the pool,
+    if given
+    :param network: an ADGN object
+    :param ccs: a list of connectivity components (each an iterable of vertices)
+    :param pool: (optional) a multiprocessing pool
+    :return: a list of the harmonic sums of the connectivity components
+    """
+    tasks = list()
+    owners = list()
+    for i, cc in enumerate(ccs):
+        if len(cc) < 2:
+            continue
+        vertices, rows, columns = network.graph.get_component_edges(cc)
+        sensors = np.flatnonzero([not vertex.get('is_relay') for vertex in vertices])
+        for start in range(0, len(sensors), HARMONIC_SOURCES_CHUNK_SIZE):
+            tasks.append((len(vertices), rows, columns, sensors[start:start + HARMONIC_SOURCES_CHUNK_SIZE], sensors))
+            owners.append(i)
+    results = pool.starmap(reciprocal_hop_distances_sum, tasks) if pool is not None else itertools.starmap(reciprocal_hop_distances_sum, tasks)
+    sums = [0.0] * len(ccs)
+    for owner, result in zip(owners, results):
+        sums[owner] += result
+    return [distance_sum / 2 for distance_sum in sums]
 
-def harmonic_avg_on_paths_length_fitness_function(agent):
+
+def harmonic_avg_on_paths_length_fitness_function(agent, pool=None):
+    """
+    The harmonic sums of the connectivity components are kept on the network graph between calls, so after a sensor
+    move only the connectivity components the move affected are recomputed
+    :param pool: (optional) a multiprocessing pool to run the BFS of large networks on
+    """
     if isinstance(agent, (str, bytes)):
         agent_id, network = Agent.from_json(agent_json=agent)
     else:
         network = agent.network
         agent_id = agent.agent_id
     n = len(network.graph.vertices)
-    distance_sum = list()
-    ccs = network.graph.get_connectivity_components()
-    if len(ccs) == n:
+    if len(network.graph.connectivity) == n:
         return agent_id, 0
 
-    for cc in filter(lambda cc: len(cc) > 1, ccs):
-        sensors = filter(lambda vertex: not vertex.get('is_relay'), cc)
-        sensors_pairs = itertools.combinations(sensors, 2)
-        path_distances = [network.graph.get_path_length(v1, v2) for v1, v2 in sensors_pairs]
-        distance_sum.append(sum(map(lambda d: 1.0/d, path_distances)))
+    distance_sum = network.graph.connectivity.get_components_values(
+        name='harmonic_sum_on_paths_length', compute=lambda ccs: harmonic_sums_on_paths_length(network, ccs, pool=pool))
 
-    return agent_id, ((n * (n-1)) / 2) / sum(distance_sum)
+    return agent_id, ((n * (n-1)) / 2) / sum(distance_sum.values())
 
 
 class Optimum(object):
@@ -61,3 +95,24 @@ class FitnessFunctions(object):
         if ff_info:
             return ff_info[1]
         return None
+
+    @staticmethod
+    def get_fitness_function_bound(ff, interest_areas, radius=1):
+        """
+        The best fitness any network of the interest areas (without relays) can reach. A connectivity component never
+        spans two reach components (see network.interest_areas.get_reachable_components), so the bound of
+        fitness 1 is the sum of the squared reach components sizes, and since every path is at least one hop long
+        the bound of fitness 3 is the amount of pairs divided by the amount of pairs in reach of each other
+        :param ff: the fitness function id
+        :param interest_areas: the interest areas of the networks
+        :param radius: the graph radius
+        :return: the bound, or None for a fitness function without a bound
+        """
+        sizes = np.array([len(cc) for cc in get_reachable_components(frozenset(interest_areas), radius=radius)], dtype=np.int64)
+        if ff == FitnessFunctions.SUM_SQUARE_CC_SIZE:
+            return int((sizes ** 2).sum())
+        if ff == FitnessFunctions.HARMONIC_AVG_PATH_LENGTH:
+            n = int(sizes.sum())
+            reachable_pairs = int((sizes * (sizes - 1) // 2).sum())
+            return ((n * (n - 1)) / 2) / reachable_pairs if reachable_pairs else None
+        return None
@@ -1,12 +1,143 @@
-import random
-
-
-def check_resilience(network):
-    statistics = list()
-    removed_nodes = 0
-    while len(network.graph.vertices) > 0:
-        statistics.append((removed_nodes, max(map(lambda cc: len(cc), network.graph.get_connectivity_components()))))
-        random_node = random.choice(list(network.graph.vertices))
-        network.graph.remove_node(random_node)
-        removed_nodes += 1
-    return statistics
+import numpy as np
+
+from graphs.paths import betweenness_centrality
+
+RANDOM = 'random'
+DEGREE = 'degree'
+BETWEENNESS = 'betweenness'
+ATTACKS = (RANDOM, DEGREE, BETWEENNESS)
+
+
+def get_network_adjacency(network):
+    """
+    :return: a tuple (indptr, indices) of the network graph adjacency in CSR form, by the graph vertices indices
+    """
+    neighbors = network.graph.get_neighbors_indices()
+    degrees = np.array([len(vertex_neighbors) for vertex_neighbors in neighbors], dtype=np.int64)
+    indptr = np.zeros(len(neighbors) + 1, dtype=np.int64)
+    np.cumsum(degrees, out=indptr[1:])
+    indices = np.fromiter((neighbor for vertex_neighbors in neighbors for neighbor in vertex_neighbors),
+                          dtype=np.int64, count=int(indptr[-1]))
+    return indptr, indices
+
+
+def get_attack_scores(indptr, indices, attack):
+    """
+    An attack removes the vertices by decreasing score, so a random attack scores all the vertices the same
+    :param attack: random, degree or betweenness
+    :return: an array of the attack score of every vertex
+    """
+    if attack not in ATTACKS:
+        raise ValueError('Unknown attack {}. Please use one of {}'.format(attack, ATTACKS))
+    if attack == DEGREE:
+        return np.diff(indptr).astype(float)
+    if attack == BETWEENNESS:
+        return betweenness_centrality([indices[indptr[i]:indptr[i + 1]].tolist() for i in range(len(indptr) - 1)])
+    return np.zeros(len(indptr) - 1, dtype=float)
+
+
+def get_attack_order(scores, random_state):
+    """
+    :return: the vertices indices by decreasing score, ties broken randomly
+    """
+    return np.lexsort((random_state.random_sample(len(scores)), -np.asarray(scores)))
+
+
+def get_largest_component_curve(indptr, indices, order):
+    """
+    Adds the vertices back in the reverse removal order and merges their components with a union-find (by size, with
+    path halving), so the whole curve costs O(m * alpha(n)) instead of a components search after every removal
+    :param indptr: the graph adjacency indptr (see get_network_adjacency)
+    :param indices: the graph adjacency indices (see get_network_adjacency)
+    :param order: the removal order of the vertices indices
+    :return: an array where the k-th item is the size of the largest connectivity component after removing the
+    first k vertices of the order
+    """
+    size = len(order)
+    indptr = indptr.tolist()
+    indices = indices.tolist()
+    parents = list(range(size))
+    sizes = [1] * size
+    present = [False] * size
+    curve = np.zeros(size, dtype=np.int64)
+
+    def find(vertex):
+        while parents[vertex] != vertex:
+            parents[vertex] = parents[parents[vertex]]
+            vertex = parents[vertex]
+        return vertex
+
+    largest = 0
+    for k in range(size - 1, -1, -1):
+        vertex = int(order[k])
+        present[vertex] = True
+        root = vertex
+        for neighbor in indices[indptr[vertex]:indptr[vertex + 1]]:
+            if not present[neighbor]:
+                continue
+            neighbor_root = find(neighbor)
+            if neighbor_root == root:
+                continue
+            if sizes[root] < sizes[neighbor_root]:
+                root, neighbor_root = neighbor_root, root
+            parents[neighbor_root] = root
+            sizes[root] += sizes[neighbor_root]
+        largest = max(largest, sizes[root])
+        curve[k] = largest
+    return curve
+
+
+def get_resilience_curves(indptr, indices, scores, seeds):
+    """
+    Runs a trial for every seed. Trials differ by the random order of the vertices with equal attack scores
+    :return: an array of shape (seeds, vertices) of the largest component curves (see get_largest_component_curve)
+    """
+    curves = np.zeros(shape=(len(seeds), len(scores)), dtype=np.int64)
+    for i, seed in enumerate(seeds):
+        order = get_attack_order(scores, np.random.RandomState(seed))
+        curves[i] = get_largest_component_curve(indptr, indices, order)
+    return curves
+
+
+def check_resilience(network, attack=RANDOM):
+    """
+    :param network: an ADGN object
+    :param attack: random, degree or betweenness (see get_attack_scores)
+    :return: a list of tuples (removed vertices, size of the largest connectivity component) of a single attack
+    """
+    indptr, indices = get_network_adjacency(network)
+    scores = get_attack_scores(indptr, indices, attack)
+    curve = get_largest_component_curve(indptr, indices, get_attack_order(scores, np.random))
+    return list(enumerate(curve.tolist()))
+
+
+def get_resilience_report(network, attack=RANDOM, trials=100, percentiles=(5, 50, 95), seed=None, pool=None,
+                          chunk_size=16):
+    """
+    Monte Carlo resilience of a network. The attack scores (the betweenness above all) are computed once and every
+    trial only draws its own removal order. The scores are static, so a targeted attack does not recompute them
+    after every removal.
+    :param network: an ADGN object
+    :param attack: random, degree or betweenness (see get_attack_scores)
+    :param trials: the amount of trials
+    :param percentiles: the percentiles of the largest component sizes to report
+    :param seed: (optional) the seed of the trials
+    :param pool: (optional) a multiprocessing pool to run the trials on, in chunks of chunk_size trials
+    :return: a dict with the amounts of removed vertices ('removed'), the mean largest component size after every
+    amount of removals ('mean') and the largest component sizes of every percentile (keyed by the percentile)
+    """
+    if trials < 1:
+        raise ValueError('The amount of trials must be at least 1')
+    indptr, indices = get_network_adjacency(network)
+    scores = get_attack_scores(indptr, indices, attack)
+    seeds = np.random.RandomState(seed).randint(np.iinfo(np.int32).max, size=trials)
+    tasks = [(indptr, indices, scores, seeds[start:start + chunk_size]) for start in range(0, trials, chunk_size)]
+    results = pool.starmap(get_resilience_curves, tasks) if pool is not None else [get_resilience_curves(*task) for task in tasks]
+    curves = np.concatenate(results)
+    report = {
+        'removed': np.arange(len(scores)),
+        'mean': curves.mean(axis=0),
+    }
+    for percentile, values in zip(percentiles, np.percentile(curves, percentiles, axis=0)):
+        report[percentile] = values
+    return report
@@ -0,0 +1,253 @@
+import argparse
+import json
+import logging
+import math
+import platform
+import random
+import statistics
+import time
+
+from sys import stdout
+
+import numpy as np
+
+from analysis.fitness_functions import FitnessFunctions
+from graphs.graphs import DiskGraph
+from network.interest_areas import InterestAreaGenerator
+from network.network import ADGN
+from optimization.ga import GA, Agent, ParallelGA
+from optimization.operators import breed_networks
+from optimization.parallel import create_pool
+
+formatter = logging.Formatter('%(asctime)s %(levelname)s: %(message)s')
+handler = logging.StreamHandler(stdout)
+handler.setFormatter(formatter)
+logger = logging.getLogger('BENCHMARK')
+logger.setLevel(logging.INFO)
+logger.addHandler(handler)
+
+# the interest areas density of the generated scenarios (about the density of the README example)
+INTEREST_AREAS_PER_UNIT_AREA = 0.7
+
+
+class Scenario(object):
+    """
+    A reproducible benchmark input: seeded random interest areas and a population of randomized networks on them
+    """
+
+    def __init__(self, size, seed, population_size):
+        self.size = size
+        self.seed = seed
+        self.population_size = population_size
+        random.seed(seed)
+        limit = math.sqrt(size / INTEREST_AREAS_PER_UNIT_AREA) / 2
+        self.xlims = (-limit, limit)
+        self.ylims = (-limit, limit)
+        self.interest_areas = InterestAreaGenerator.random(amount=size, xlims=self.xlims, ylims=self.ylims,
+                                                           allow_overlapping=True)
+        self.packed_networks = list()
+        for i in range(population_size):
+            network = ADGN(interest_areas=self.interest_areas)
+            network.randomize()
+            self.packed_networks.append(network.pack())
+
+    def get_network(self, index=0):
+        return ADGN.unpack(interest_areas=self.interest_areas, packed=self.packed_networks[index])
+
+    def get_agents(self):
+        return [Agent(network=self.get_network(index)) for index in range(self.population_size)]
+
+    def create_ga(self, fitness_function, pool=None):
+        ga_info = dict(interest_areas=self.interest_areas, initial_population_size=self.population_size, generations=2,
+                       fitness_function=FitnessFunctions.get_fitness_function(fitness_function),
+                       optimum=FitnessFunctions.get_fitness_function_optimum(fitness_function), fitness_cache_size=0)
+        ga = ParallelGA(pool=pool, **ga_info) if pool else GA(**ga_info)
+        ga.agents = self.get_agents()
+        return ga
+
+
+def bench_disk_graph_construction(scenario, **kwargs):
+    vertices = set(scenario.get_network().sensors.sensors)
+    start = time.perf_counter()
+    DiskGraph(vertices=vertices, radius=1)
+    return time.perf_counter() - start, 1
+
+
+def bench_construct_edges(scenario, moves=100, **kwargs):
+    network = scenario.get_network()
+    sensors = [network.get_random_sensor(include_relays=False) for _ in range(moves)]
+    elapsed = 0
+    for sensor in sensors:
+        network.hop_random(sensor=sensor)
+        start = time.perf_counter()
+        network.graph.construct_edges(vertex=sensor)
+        elapsed += time.perf_counter() - start
+    return elapsed, moves
+
+
+def bench_connectivity_components(scenario, **kwargs):
+    network = scenario.get_network()
+    start = time.perf_counter()
+    network.graph.get_connectivity_components()
+    return time.perf_counter() - start, 1
+
+
+def bench_fitness(fitness_function):
+
+    def bench(scenario, **kwargs):
+        agent = Agent(network=scenario.get_network())
+        calc_fitness = FitnessFunctions.get_fitness_function(fitness_function)
+        start = time.perf_counter()
+        calc_fitness(agent=agent)
+        return time.perf_counter() - start, 1
+    return bench
+
+
+def bench_breed(scenario, fitness_function, **kwargs):
+    ga = scenario.create_ga(fitness_function=fitness_function)
+    start = time.perf_counter()
+    ga.breed()
+    return time.perf_counter() - start, scenario.population_size // 2
+
+
+def bench_breed_networks(scenario, **kwargs):
+    n1 = scenario.get_network(0)
+    n2 = scenario.get_network(1 % scenario.population_size)
+    start = time.perf_counter()
+    breed_networks([n1], [n2], interest_areas=scenario.interest_areas)
+    return time.perf_counter() - start, 1
+
+
+def bench_add_relays(scenario, fitness_function, **kwargs):
+    ga = scenario.create_ga(fitness_function=fitness_function)
+    ga.agents = ga.agents[:1]
+    start = time.perf_counter()
+    ga.add_relays()
+    return time.perf_counter() - start, 1
+
+
+def run_generation(ga):
+    ga.calc_fitness()
+    start = time.perf_counter()
+    for _, phase in ga.ga_steps:
+        phase()
+    return time.perf_counter() - start, 1
+
+
+def bench_serial_generation(scenario, fitness_function, **kwargs):
+    return run_generation(scenario.create_ga(fitness_function=fitness_function))
+
+
+def bench_parallel_generation(scenario, fitness_function, pool=None, **kwargs):
+    return run_generation(scenario.create_ga(fitness_function=fitness_function, pool=pool))
+
+
+BENCHMARKS = {
+    'disk_graph_construction': bench_disk_graph_construction,
+    'construct_edges': bench_construct_edges,
+    'connectivity_components': bench_connectivity_components,
+    'fitness_sum_square_cc_size': bench_fitness(FitnessFunctions.SUM_SQUARE_CC_SIZE),
+    'fitness_harmonic_avg_path_length': bench_fitness(FitnessFunctions.HARMONIC_AVG_PATH_LENGTH),
+    'breed': bench_breed,
+    'breed_networks': bench_breed_networks,
+    'add_relays': bench_add_relays,
+    'serial_generation': bench_serial_generation,
+    'parallel_generation': bench_parallel_generation,
+}
+
+
+def run_benchmarks(sizes, benchmarks, repeat, seed, population_size, fitness_function, processes=None):
+    """
+    Runs every benchmark on a seeded scenario of every size
+    :return: a list of results dicts, one per benchmark and size
+    """
+    results = list()
+    for size in sizes:
+        logger.info('creating scenario of %s interest areas', size)
+        scenario = Scenario(size=size, seed=seed, population_size=population_size)
+        pool = create_pool(interest_areas=scenario.interest_areas, processes=processes) if 'parallel_generation' in benchmarks else None
+        try:
+            for name in benchmarks:
+                times = list()
+                operations = 0
+                for i in range(repeat):
+                    random.seed(seed + i)
+                    elapsed, operations = BENCHMARKS[name](scenario, fitness_function=fitness_function, pool=pool)
+                    times.append(elapsed)
+                result = {
+                    'benchmark': name,
+                    'size': size,
+                    'operations': operations,
+                    'repeat': repeat,
+                    'min': min(times),
+                    'median': statistics.median(times),
+                    'mean': statistics.mean(times),
+                    'times': times,
+                }
+                logger.info('%s (size %s): median %.6f seconds, min %.6f seconds', name, size, result['median'], result['min'])
+                results.append(result)
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+    return results
+
+
+def compare(results, baseline_results):
+    """
+    Logs the ratio between the median times of the results and the baseline results of the same benchmark and size
+    """
+    baseline = {(result['benchmark'], result['size']): result for result in baseline_results}
+    for result in results:
+        baseline_result = baseline.get((result['benchmark'], result['size']))
+        if baseline_result and baseline_result['median'] > 0:
+            logger.info('%s (size %s): %.2fx of baseline', result['benchmark'], result['size'],
+                        result['median'] / baseline_result['median'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the adhoc network optimization building blocks')
+    parser.add_argument('--sizes', dest='sizes', required=False, type=int, nargs='+', default=[50, 200, 1000],
+                        help='The amounts of interest areas of the benchmarked scenarios')
+    parser.add_argument('--benchmarks', dest='benchmarks', required=False, nargs='+', default=list(BENCHMARKS.keys()),
+                        choices=list(BENCHMARKS.keys()), help='The benchmarks to run (default all)')
+    parser.add_argument('--repeat', dest='repeat', required=False, type=int, default=5,
+                        help='How many times every benchmark runs')
+    parser.add_argument('--seed', dest='seed', required=False, type=int, default=0,
+                        help='The random seed of the scenarios')
+    parser.add_argument('--population', dest='population', required=False, type=int, default=10,
+                        help='The population size for the breeding and generation benchmarks')
+    parser.add_argument('--fitness-function', dest='fitness_function', required=False, type=int, default=1,
+                        help='The fitness function of the GA benchmarks. 1 (sum square cc size) or 3 (harmonic avg path length)')
+    parser.add_argument('--processes', dest='processes', required=False, type=int, default=None,
+                        help='The amount of processes for the parallel generation benchmark (default cpu count)')
+    parser.add_argument('--output', dest='output', required=False, type=str, default='benchmark.json',
+                        help='The output json file with the benchmark results')
+    parser.add_argument('--baseline', dest='baseline', required=False, type=str, default=None,
+                        help='A previous output json file to compare the results to')
+
+    args = parser.parse_args()
+    results = run_benchmarks(sizes=args.sizes, benchmarks=args.benchmarks, repeat=args.repeat, seed=args.seed,
+                             population_size=args.population, fitness_function=args.fitness_function,
+                             processes=args.processes)
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'seed': args.seed,
+        'population': args.population,
+        'fitness_function': args.fitness_function,
+        'results': results,
+    }
+    logger.info('writing results to %s', args.output)
+    with open(args.output, 'w') as file:
+        file.write(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            compare(results, json.loads(file.read())['results'])
+
+
+if __name__ == '__main__':
+    main()
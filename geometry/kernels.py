@@ -0,0 +1,142 @@
+import numpy as np
+
+
+def get_distances(points1, points2):
+    """
+    Points are arrays of shape (..., 2). Like all the functions here the arguments broadcast like numpy arrays do,
+    so a single point (or circle) is tested against many at once
+    :return: the euclidean distances between the points of two (broadcastable) arrays of points
+    """
+    deltas = np.asarray(points2, dtype=float) - np.asarray(points1, dtype=float)
+    return np.hypot(deltas[..., 0], deltas[..., 1])
+
+
+def project_into_circles(points, centers, radii):
+    """
+    :return: the points moved to the nearest point of their circles (points already in their circles do not move)
+    """
+    points = np.asarray(points, dtype=float)
+    centers = np.asarray(centers, dtype=float)
+    deltas = points - centers
+    distances = np.hypot(deltas[..., 0], deltas[..., 1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scales = np.where(distances > radii, radii / distances, 1)
+    return centers + deltas * scales[..., np.newaxis]
+
+
+def get_intersecting_circles_mask(centers1, radii1, centers2, radii2):
+    """
+    :return: a boolean array of whether every pair of disks intersects (like Circle.intersects)
+    """
+    return get_distances(centers1, centers2) < np.add(radii1, radii2)
+
+
+def get_pairs_within(points, radius):
+    """
+    All the pairs of points within a distance of each other. The points are hashed into a grid of square cells of
+    the radius size and only the points of neighboring cells are compared, so the work is linear in the amount of
+    points and pairs found
+    :param points: an array of shape (n, 2)
+    :param radius: the maximal distance between the points of a pair (inclusive)
+    :return: a tuple of two index arrays (first, second) with first < second for every pair
+    """
+    points = np.asarray(points, dtype=float)
+    if len(points) < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    cells = np.floor(points / radius).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    width = cells[:, 1].max() + 2
+
+    def get_keys(x_cells, y_cells):
+        return x_cells * width + y_cells
+
+    keys = get_keys(cells[:, 0], cells[:, 1])
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    first, second = list(), list()
+    # every pair of neighboring cells is visited once: the cell itself and four of its eight neighbors
+    for x_offset, y_offset in ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1)):
+        targets = get_keys(cells[:, 0] + x_offset, cells[:, 1] + y_offset)
+        starts = np.searchsorted(sorted_keys, targets, side='left')
+        counts = np.searchsorted(sorted_keys, targets, side='right') - starts
+        total = counts.sum()
+        if not total:
+            continue
+        ends = np.cumsum(counts)
+        positions = np.arange(total) - np.repeat(ends - counts, counts) + np.repeat(starts, counts)
+        offset_first = np.repeat(np.arange(len(points)), counts)
+        offset_second = order[positions]
+        if x_offset == 0 and y_offset == 0:
+            keep = offset_first < offset_second
+            offset_first = offset_first[keep]
+            offset_second = offset_second[keep]
+        first.append(offset_first)
+        second.append(offset_second)
+    if not first:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    first = np.concatenate(first)
+    second = np.concatenate(second)
+    within = get_distances(points[first], points[second]) <= radius
+    first, second = np.minimum(first[within], second[within]), np.maximum(first[within], second[within])
+    return first, second
+
+
+def get_pairs_across(points, sides, radius):
+    """
+    All the pairs of points of different sides within a distance of each other. Only the points with a point of the
+    other side in their own or a neighboring grid cell (of the radius size) can be in such a pair, so only they are
+    compared (see get_pairs_within)
+    :param points: an array of shape (n, 2)
+    :param sides: a boolean array of shape (n,) of the side of every point
+    :param radius: the maximal distance between the points of a pair (inclusive)
+    :return: a tuple of two index arrays (first, second) with first < second for every pair
+    """
+    points = np.asarray(points, dtype=float)
+    sides = np.asarray(sides, dtype=bool)
+    if sides.all() or not sides.any():
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    cells = np.floor(points / radius).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    shape = tuple(cells.max(axis=0) + 2)
+    if shape[0] * shape[1] > 16 * len(points):
+        # the points are too sparse for a dense grid of occupied cells
+        frontier = np.ones(len(points), dtype=bool)
+    else:
+        occupied = np.zeros((2,) + shape, dtype=bool)
+        occupied[sides.astype(np.int64), cells[:, 0], cells[:, 1]] = True
+        near = np.zeros_like(occupied)
+        for x_offset in (-1, 0, 1):
+            for y_offset in (-1, 0, 1):
+                near[:, 1:-1, 1:-1] |= occupied[:, 1 + x_offset:shape[0] - 1 + x_offset, 1 + y_offset:shape[1] - 1 + y_offset]
+        frontier = near[(~sides).astype(np.int64), cells[:, 0], cells[:, 1]]
+    indices = np.flatnonzero(frontier)
+    first, second = get_pairs_within(points[indices], radius)
+    across = sides[indices[first]] != sides[indices[second]]
+    return indices[first[across]], indices[second[across]]
+
+
+def get_lenses_centers(centers1, radii1, centers2, radii2):
+    """
+    The center of the lens of every pair of intersecting circles: the middle of the segment the two disks share on the
+    line between their centers. For circles of equal radii it is the mid point of the chord between the intersection
+    points. Unlike the chord, the segment also exists when one disk contains the other.
+    :param centers1: an array of shape (n, 2) of the first circles centers
+    :param radii1: an array of shape (n,) of the first circles radii
+    :param centers2: an array of shape (n, 2) of the second circles centers
+    :param radii2: an array of shape (n,) of the second circles radii
+    :return: an array of shape (n, 2) of the lenses centers (NaN for disks that do not intersect)
+    """
+    centers1 = np.asarray(centers1, dtype=float)
+    centers2 = np.asarray(centers2, dtype=float)
+    radii1 = np.asarray(radii1, dtype=float)
+    radii2 = np.asarray(radii2, dtype=float)
+    deltas = centers2 - centers1
+    distances = get_distances(centers1, centers2)
+    # the shared segment as distances from the first center along the line to the second center
+    low = np.maximum(-radii1, distances - radii2)
+    high = np.minimum(radii1, distances + radii2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        directions = np.where(distances[:, np.newaxis] > 0, deltas / distances[:, np.newaxis], 0)
+    centers = centers1 + ((low + high) / 2)[:, np.newaxis] * directions
+    centers[~(low < high)] = np.nan
+    return centers
@@ -1,6 +1,5 @@
 import itertools
 import math
-import numpy as np
 
 from geometry.metrics import euclidean_metric
 
@@ -32,47 +31,14 @@ class LineSegment(object):
     def get_intersection_point(self, line_segment):
         if self.is_parallel(line_segment=line_segment):
             return None
-        else:
-            x_numerator = np.linalg.det(
-                [
-                    [
-                        np.linalg.det([[self.p1[0], self.p1[1]], [self.p2[0], self.p2[1]]]),
-                        np.linalg.det([[self.p1[0], 1], [self.p2[0], 1]])
-                    ],
-                    [
-                        np.linalg.det([[line_segment.p1[0], line_segment.p1[1]], [line_segment.p2[0], line_segment.p2[1]]]),
-                        np.linalg.det([[line_segment.p1[0], 1], [line_segment.p2[0], 1]])
-                    ]
-                ]
-            )
-
-            y_numerator = np.linalg.det(
-                [
-                    [
-                        np.linalg.det([[self.p1[0], self.p1[1]], [self.p2[0], self.p2[1]]]),
-                        np.linalg.det([[self.p1[1], 1], [self.p2[1], 1]])
-                    ],
-                    [
-                        np.linalg.det([[line_segment.p1[0], line_segment.p1[1]], [line_segment.p2[0], line_segment.p2[1]]]),
-                        np.linalg.det([[line_segment.p1[1], 1], [line_segment.p2[1], 1]])
-                    ]
-                ]
-            )
-
-            denominator = np.linalg.det(
-                [
-                    [
-                        np.linalg.det([[self.p1[0], 1], [self.p2[0], 1]]),
-                        np.linalg.det([[self.p1[1], 1], [self.p2[1], 1]])
-                    ],
-                    [
-                        np.linalg.det([[line_segment.p1[0], 1], [line_segment.p2[0], 1]]),
-                        np.linalg.det([[line_segment.p1[1], 1], [line_segment.p2[1], 1]])
-                    ]
-                ]
-            )
-
-            return (x_numerator / denominator), (y_numerator / denominator)
+        # closed form intersection of the two lines through the segments (Cramer's rule on the cross products)
+        r_x, r_y = self.p2[0] - self.p1[0], self.p2[1] - self.p1[1]
+        s_x, s_y = line_segment.p2[0] - line_segment.p1[0], line_segment.p2[1] - line_segment.p1[1]
+        denominator = r_x * s_y - r_y * s_x
+        if denominator == 0:
+            return None
+        t = ((line_segment.p1[0] - self.p1[0]) * s_y - (line_segment.p1[1] - self.p1[1]) * s_x) / denominator
+        return self.p1[0] + t * r_x, self.p1[1] + t * r_y
 
 
 class Circle(object):
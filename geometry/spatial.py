@@ -0,0 +1,73 @@
+import math
+from collections import defaultdict
+
+import numpy as np
+
+
+class GridIndex(object):
+    """
+    A uniform grid spatial index over the [xy] plane.
+    Every item is kept in the square cell containing its location, so all the items within distance cell_size
+    (under any Lp metric) of a point are found in the 3x3 block of cells around it.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = defaultdict(set)
+        self.items_cells = dict()
+
+    def __len__(self):
+        return len(self.items_cells)
+
+    def __contains__(self, item):
+        return item in self.items_cells
+
+    def get_cell(self, point):
+        return int(math.floor(point[0] / self.cell_size)), int(math.floor(point[1] / self.cell_size))
+
+    def insert(self, item, point):
+        cell = self.get_cell(point)
+        self.cells[cell].add(item)
+        self.items_cells[item] = cell
+
+    def insert_many(self, items, points):
+        """
+        :param items: a sequence of items
+        :param points: an array of shape (items, 2) of the items locations
+        """
+        cells = np.floor(np.asarray(points, dtype=float) / self.cell_size).astype(np.int64).tolist()
+        for item, (x_cell, y_cell) in zip(items, cells):
+            cell = (x_cell, y_cell)
+            self.cells[cell].add(item)
+            self.items_cells[item] = cell
+
+    def remove(self, item):
+        cell = self.items_cells.pop(item, None)
+        if cell is not None:
+            self.cells[cell].discard(item)
+            if not self.cells[cell]:
+                del self.cells[cell]
+
+    def move(self, item, point):
+        cell = self.get_cell(point)
+        if self.items_cells.get(item) != cell:
+            self.remove(item)
+            self.cells[cell].add(item)
+            self.items_cells[item] = cell
+
+    def query(self, point, radius=None):
+        """
+        :param point: the center of the query
+        :param radius: (optional) the query radius. defaults to the cell size
+        :return: the items in all the cells intersecting the square bounding the query disk.
+        the caller is expected to filter the candidates by the exact metric
+        """
+        reach = 1 if radius is None else int(math.ceil(radius / self.cell_size))
+        x_cell, y_cell = self.get_cell(point)
+        candidates = []
+        for x in range(x_cell - reach, x_cell + reach + 1):
+            for y in range(y_cell - reach, y_cell + reach + 1):
+                cell = self.cells.get((x, y))
+                if cell:
+                    candidates.extend(cell)
+        return candidates
@@ -0,0 +1,144 @@
+import numpy as np
+
+
+class AdjacencySets(object):
+    """
+    A sparse adjacency store. Every vertex index holds a dict of its neighbors indices to the edges weights.
+    Memory is O(n + m) and edge updates cost O(1).
+    """
+
+    def __init__(self, directed=False):
+        self.directed = directed
+        self.successors_list = []
+        self.predecessors_list = [] if directed else self.successors_list
+
+    def __len__(self):
+        return len(self.successors_list)
+
+    def add_slot(self):
+        self.successors_list.append(dict())
+        if self.directed:
+            self.predecessors_list.append(dict())
+        return len(self.successors_list) - 1
+
+    def remove_slot(self, index):
+        """
+        Removes an index and all of its edges. The last index is moved into the freed slot.
+        :param index: the index to remove
+        :return: the index that was moved into the freed slot or None if no index was moved
+        """
+        for j in list(self.successors_list[index]):
+            self.remove_edge(index, j)
+        for j in list(self.predecessors_list[index]):
+            self.remove_edge(j, index)
+        last = len(self.successors_list) - 1
+        moved = None
+        if index != last:
+            successors = self.successors_list[last]
+            predecessors = self.predecessors_list[last]
+            self_loop_weight = successors.pop(last, None)
+            predecessors.pop(last, None)
+            for j in successors:
+                self.predecessors_list[j][index] = self.predecessors_list[j].pop(last)
+            if self.directed:
+                for j in predecessors:
+                    self.successors_list[j][index] = self.successors_list[j].pop(last)
+                self.predecessors_list[index] = predecessors
+            self.successors_list[index] = successors
+            if self_loop_weight is not None:
+                self.set_edge(index, index, self_loop_weight)
+            moved = last
+        self.successors_list.pop()
+        if self.directed:
+            self.predecessors_list.pop()
+        return moved
+
+    def set_edge(self, i, j, weight=1):
+        self.successors_list[i][j] = weight
+        self.predecessors_list[j][i] = weight
+
+    def remove_edge(self, i, j):
+        self.successors_list[i].pop(j, None)
+        self.predecessors_list[j].pop(i, None)
+
+    def get_weight(self, i, j):
+        return self.successors_list[i].get(j, 0)
+
+    def successors(self, index):
+        return self.successors_list[index].keys()
+
+    def predecessors(self, index):
+        return self.predecessors_list[index].keys()
+
+    def get_neighbors_lists(self):
+        return self.successors_list
+
+    def as_matrix(self):
+        adj = np.zeros(shape=(len(self), len(self)), dtype=float)
+        for i, successors in enumerate(self.successors_list):
+            for j, weight in successors.items():
+                adj[i, j] = weight
+        return adj
+
+
+class DenseAdjacency(object):
+    """
+    A dense adjacency matrix store with amortized growth. Memory is O(n^2) and neighbors iteration costs O(n).
+    """
+
+    def __init__(self, directed=False, capacity=16):
+        self.directed = directed
+        self.size = 0
+        self.matrix = np.zeros(shape=(capacity, capacity), dtype=float)
+
+    def __len__(self):
+        return self.size
+
+    def add_slot(self):
+        capacity = self.matrix.shape[0]
+        if self.size == capacity:
+            matrix = np.zeros(shape=(2 * capacity, 2 * capacity), dtype=float)
+            matrix[:capacity, :capacity] = self.matrix
+            self.matrix = matrix
+        self.size += 1
+        return self.size - 1
+
+    def remove_slot(self, index):
+        """
+        Removes an index and all of its edges. The last index is moved into the freed slot.
+        :param index: the index to remove
+        :return: the index that was moved into the freed slot or None if no index was moved
+        """
+        last = self.size - 1
+        moved = None
+        if index != last:
+            self.matrix[index, :] = self.matrix[last, :]
+            self.matrix[:, index] = self.matrix[:, last]
+            moved = last
+        self.matrix[last, :] = 0
+        self.matrix[:, last] = 0
+        self.size -= 1
+        return moved
+
+    def set_edge(self, i, j, weight=1):
+        self.matrix[i, j] = weight
+        if not self.directed:
+            self.matrix[j, i] = weight
+
+    def remove_edge(self, i, j):
+        self.set_edge(i, j, weight=0)
+
+    def get_weight(self, i, j):
+        return self.matrix[i, j]
+
+    def successors(self, index):
+        return np.nonzero(self.matrix[index, :self.size])[0].tolist()
+
+    def predecessors(self, index):
+        return np.nonzero(self.matrix[:self.size, index])[0].tolist()
+
+    def get_neighbors_lists(self):
+        return [self.successors(index) for index in range(self.size)]
+
+    def as_matrix(self):
+        return self.matrix[:self.size, :self.size].copy()
@@ -0,0 +1,196 @@
+from collections import deque
+
+from utils import metrics
+
+
+def get_components_indices(size, rows, columns):
+    """
+    A union-find over the vertices indices (plain integers are much cheaper to hash than vertices)
+    :param size: the amount of vertices (indexed 0 to size - 1)
+    :param rows: the first indices of the edges
+    :param columns: the second indices of the edges
+    :return: a list of the lists of the indices of every connectivity component
+    """
+    parents = list(range(size))
+
+    def find(index):
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    for i, j in zip(rows, columns):
+        root_i = find(i)
+        root_j = find(j)
+        if root_i != root_j:
+            parents[root_i] = root_j
+    components = dict()
+    for index in range(size):
+        components.setdefault(find(index), list()).append(index)
+    return list(components.values())
+
+
+class ConnectivityComponents(object):
+    """
+    Maintains the connectivity components of a graph across vertices and edges updates.
+    The components are disjoint sets merged by size on edge insertion (the smaller set is relabeled into the larger one).
+    On edge deletion a BFS runs from both endpoints in lockstep and stops as soon as the searches meet. If one of the
+    searches is exhausted first, only the vertices it visited are split into a new component.
+    Every component has a version that changes whenever one of its edges changes, so values derived from a component
+    (see get_components_values) are only recomputed for the components an update affected.
+    The sum of the squared components sizes is kept up to date on every update.
+    """
+
+    def __init__(self, get_neighbors):
+        """
+        :param get_neighbors: a function returning all the vertices adjacent to a given vertex (in any direction)
+        """
+        self.get_neighbors = get_neighbors
+        self.components_ids = dict()
+        self.members = dict()
+        self.frozen_components = dict()
+        self.versions = dict()
+        self.components_values = dict()
+        self.next_component_id = 0
+        self.sum_square_sizes = 0
+
+    def __len__(self):
+        return len(self.members)
+
+    def create_component(self, vertices):
+        component_id = self.next_component_id
+        self.next_component_id += 1
+        self.members[component_id] = set(vertices)
+        self.versions[component_id] = 0
+        self.sum_square_sizes += len(self.members[component_id]) ** 2
+        for vertex in vertices:
+            self.components_ids[vertex] = component_id
+        return component_id
+
+    def discard_component(self, component_id):
+        self.frozen_components.pop(component_id, None)
+        self.versions.pop(component_id)
+        members = self.members.pop(component_id)
+        self.sum_square_sizes -= len(members) ** 2
+        return members
+
+    def touch(self, component_id):
+        self.frozen_components.pop(component_id, None)
+        self.versions[component_id] += 1
+
+    def search(self, vertex, allowed):
+        metrics.count(metrics.BFS_RUNS)
+        visited = {vertex}
+        q = deque([vertex])
+        while q:
+            v = q.popleft()
+            for neighbor in self.get_neighbors(v):
+                if neighbor not in visited and neighbor in allowed:
+                    visited.add(neighbor)
+                    q.append(neighbor)
+        return visited
+
+    def add_vertex(self, vertex):
+        self.create_component([vertex])
+
+    def add_components(self, components):
+        """
+        Adds the vertices of whole components at once (when the components of a new graph are already known)
+        :param components: an iterable of the vertices iterables of the components
+        """
+        for component in components:
+            self.create_component(component)
+
+    def remove_vertex(self, vertex):
+        """
+        Should be called after the vertex and its edges were removed from the graph
+        :param vertex: the removed vertex
+        """
+        remaining = self.discard_component(self.components_ids.pop(vertex))
+        remaining.discard(vertex)
+        while remaining:
+            component = self.search(next(iter(remaining)), allowed=remaining)
+            remaining -= component
+            self.create_component(component)
+
+    def union(self, v1, v2):
+        """
+        Should be called after an edge was added between v1 and v2
+        """
+        c1 = self.components_ids[v1]
+        c2 = self.components_ids[v2]
+        if c1 == c2:
+            self.touch(c1)
+            return
+        if len(self.members[c1]) < len(self.members[c2]):
+            c1, c2 = c2, c1
+        merged = self.discard_component(c2)
+        for vertex in merged:
+            self.components_ids[vertex] = c1
+        self.sum_square_sizes -= len(self.members[c1]) ** 2
+        self.members[c1].update(merged)
+        self.sum_square_sizes += len(self.members[c1]) ** 2
+        self.touch(c1)
+
+    def split(self, v1, v2):
+        """
+        Should be called after the edge between v1 and v2 was removed
+        """
+        component_id = self.components_ids[v1]
+        if component_id != self.components_ids[v2] or v1 == v2:
+            return
+        self.touch(component_id)
+        metrics.count(metrics.BFS_RUNS)
+        visited = ({v1}, {v2})
+        queues = (deque([v1]), deque([v2]))
+        while True:
+            for side in (0, 1):
+                if not queues[side]:
+                    self.sum_square_sizes -= len(self.members[component_id]) ** 2
+                    self.members[component_id] -= visited[side]
+                    self.sum_square_sizes += len(self.members[component_id]) ** 2
+                    self.create_component(visited[side])
+                    return
+                v = queues[side].popleft()
+                for neighbor in self.get_neighbors(v):
+                    if neighbor in visited[1 - side]:
+                        return
+                    if neighbor not in visited[side]:
+                        visited[side].add(neighbor)
+                        queues[side].append(neighbor)
+
+    def are_connected(self, v1, v2):
+        return self.components_ids.get(v1) is not None and self.components_ids.get(v1) == self.components_ids.get(v2)
+
+    def get_component_by_id(self, component_id):
+        if component_id not in self.frozen_components:
+            self.frozen_components[component_id] = frozenset(self.members[component_id])
+        return self.frozen_components[component_id]
+
+    def get_component(self, vertex):
+        return self.get_component_by_id(self.components_ids[vertex])
+
+    def get_components(self):
+        return {self.get_component_by_id(component_id) for component_id in self.members}
+
+    def get_components_values(self, name, compute):
+        """
+        Computes a value for every component, reusing the values computed by the previous call with the same name
+        for all the components that did not change since
+        :param name: the name of the values
+        :param compute: a function computing the values of a list of components (each a set of vertices)
+        :return: a dict mapping every component id to its value
+        """
+        previous = self.components_values.get(name, dict())
+        values = dict()
+        changed = list()
+        for component_id, version in self.versions.items():
+            cached = previous.get(component_id)
+            if cached is not None and cached[0] == version:
+                values[component_id] = cached
+            else:
+                changed.append(component_id)
+        for component_id, value in zip(changed, compute([self.members[component_id] for component_id in changed])):
+            values[component_id] = (self.versions[component_id], value)
+        self.components_values[name] = values
+        return {component_id: value for component_id, (_, value) in values.items()}
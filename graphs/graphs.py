@@ -4,7 +4,13 @@ import uuid
 from collections import deque
 
 import numpy as np
+from geometry.kernels import get_pairs_within
 from geometry.metrics import euclidean_metric
+from geometry.spatial import GridIndex
+from graphs.adjacency import AdjacencySets
+from graphs.connectivity import ConnectivityComponents, get_components_indices
+from graphs.paths import bfs_hop_distances, all_pairs_hop_distances
+from utils import metrics
 
 
 class Vertex(object):
@@ -75,177 +81,272 @@ class Edge(object):
 
 class Graph(object):
 
-    def __init__(self, vertices=None, edges=None, directed=False):
+    def __init__(self, vertices=None, edges=None, directed=False, adjacency_store=AdjacencySets):
         """
         :param vertices: a set of Vertex objects
         :param edges: a set of Edge object
         :param directed: if set to True - all edges will be set to directed edges from edge.v1 to edge.v2
+        :param adjacency_store: the adjacency store class. AdjacencySets (sparse, default) or DenseAdjacency
         """
         self.vertices = vertices or set()
         self.edges = edges or set()
         self.directed = directed
 
-        self.vertices_indices_map = dict(zip(self.vertices, range(len(self.vertices))))
-        self.adj = self.get_adjacency_matrix()
+        self.adjacency = adjacency_store(directed=directed)
+        self.vertices_indices_map = dict()
+        self.indices_vertices = list()
+        for vertex in self.vertices:
+            self.vertices_indices_map[vertex] = self.adjacency.add_slot()
+            self.indices_vertices.append(vertex)
+        rows = list()
+        columns = list()
+        for edge in self.edges:
+            rows.append(self.vertices_indices_map[edge.v1])
+            columns.append(self.vertices_indices_map[edge.v2])
+            self.adjacency.set_edge(rows[-1], columns[-1], edge.weight)
+        metrics.count(metrics.EDGES_BUILT, len(self.edges))
+        # the components of all the edges are found at once rather than by merging them edge by edge
+        self.connectivity = ConnectivityComponents(get_neighbors=self.get_adjacent_vertices)
+        self.connectivity.add_components([[self.indices_vertices[index] for index in component]
+                                          for component in get_components_indices(len(self.indices_vertices), rows, columns)])
 
         self.paths = dict()
-        self.connectivity_components_map = dict()
-        self.connectivity_components = set()
+        self.neighbors_indices = None
+
+    @property
+    def adj(self):
+        return self.get_adjacency_matrix()
 
     def add_vertex(self, vertex):
-        size = len(self.vertices)
-        self.adj = np.insert(self.adj, size, 0, axis=0)
-        self.adj = np.insert(self.adj, size, 0, axis=1)
         self.vertices.add(vertex)
-        self.vertices_indices_map[vertex] = size
+        self.vertices_indices_map[vertex] = self.adjacency.add_slot()
+        self.indices_vertices.append(vertex)
+        self.connectivity.add_vertex(vertex)
+        self.clear_paths()
 
     def remove_vertex(self, vertex):
-        vertex in self.vertices_indices_map and self.vertices_indices_map.pop(vertex)
-        vertex in self.vertices and self.vertices.remove(vertex)
-        self.adj = self.get_adjacency_matrix()
-        self.paths.clear()
-        edges_to_be_removed = set(filter(lambda edge: edge.is_on_edge(vertex=vertex), self.edges))
-        self.edges = self.edges - edges_to_be_removed
-        self.connectivity_components_map.clear()
-        self.connectivity_components.clear()
+        index = self.vertices_indices_map.pop(vertex, None)
+        if index is None:
+            return
+        self.vertices.remove(vertex)
+        for successor in self.adjacency.successors(index):
+            self.edges.discard(Edge(v1=vertex, v2=self.indices_vertices[successor], directed=self.directed))
+        for predecessor in self.adjacency.predecessors(index):
+            self.edges.discard(Edge(v1=self.indices_vertices[predecessor], v2=vertex, directed=self.directed))
+        moved = self.adjacency.remove_slot(index)
+        last_vertex = self.indices_vertices.pop()
+        if moved is not None:
+            self.indices_vertices[index] = last_vertex
+            self.vertices_indices_map[last_vertex] = index
+        self.connectivity.remove_vertex(vertex)
+        self.clear_paths()
 
     def add_edge(self, v1, v2, weight=1):
-        v1_index = self.vertices_indices_map.get(v1)
-        v2_index = self.vertices_indices_map.get(v2)
-        if not self.directed:
-            self.adj[v2_index, v1_index] = weight
-        self.adj[v1_index, v2_index] = weight
+        self.adjacency.set_edge(self.vertices_indices_map[v1], self.vertices_indices_map[v2], weight)
         self.edges.add(Edge(v1=v1, v2=v2, weight=weight, directed=self.directed))
-        self.paths.clear()
-        self.connectivity_components_map.clear()
-        self.connectivity_components.clear()
+        self.connectivity.union(v1, v2)
+        metrics.count(metrics.EDGES_BUILT)
+        self.clear_paths()
 
     def remove_edge(self, edge):
-        v1_index = self.vertices_indices_map.get(edge.v1)
-        v2_index = self.vertices_indices_map.get(edge.v2)
-        if not self.directed:
-            self.adj[v2_index, v1_index] = 0
-        self.adj[v1_index, v2_index] = 0
+        self.adjacency.remove_edge(self.vertices_indices_map[edge.v1], self.vertices_indices_map[edge.v2])
         self.edges.remove(edge)
-        self.paths.clear()
-        self.connectivity_components_map.clear()
-        self.connectivity_components.clear()
+        self.connectivity.split(edge.v1, edge.v2)
+        self.clear_paths()
 
     def get_adjacency_matrix(self):
-        adj = np.zeros(shape=(len(self.vertices), len(self.vertices)), dtype=np.float)
-        for edge in self.edges:
-            if not self.directed:
-                adj[self.vertices_indices_map.get(edge.v2), self.vertices_indices_map.get(edge.v1)] = edge.weight
-            adj[self.vertices_indices_map.get(edge.v1), self.vertices_indices_map.get(edge.v2)] = edge.weight
-        # adj[np.where(adj == 0)] = np.inf
-        return adj
+        return self.adjacency.as_matrix()
+
+    def clear_paths(self):
+        self.paths.clear()
+        self.neighbors_indices = None
+
+    def get_neighbors_indices(self):
+        """
+        :return: a list where the i-th item holds the indices of the neighbors of the vertex with index i
+        """
+        if self.neighbors_indices is None:
+            self.neighbors_indices = self.adjacency.get_neighbors_lists()
+        return self.neighbors_indices
 
     def calculate_paths(self):
-        paths = dict()
-        path = np.eye(N=len(self.vertices))
-        for n in range(len(self.vertices)):
-            paths[n + 1] = path @ self.adj
-            path = paths[n + 1]
-        return paths
+        """
+        :return: a dict mapping every vertex index to the hop distances (by index) of all the vertices reachable from it
+        """
+        self.paths = all_pairs_hop_distances(self.get_neighbors_indices())
+        return self.paths
+
+    def get_indices_distances(self, index):
+        if index not in self.paths:
+            self.paths[index] = bfs_hop_distances(self.get_neighbors_indices(), index)
+        return self.paths[index]
+
+    def get_hop_distances(self, vertex):
+        """
+        Single source hop distances
+        :param vertex: the source vertex
+        :return: a dict mapping every vertex reachable from vertex to its hop distance
+        """
+        distances = self.get_indices_distances(self.vertices_indices_map[vertex])
+        return {self.indices_vertices[index]: distance for index, distance in distances.items()}
+
+    def get_all_hop_distances(self):
+        """
+        All pairs hop distances
+        :return: a dict mapping every vertex to its single source hop distances (see get_hop_distances)
+        """
+        for index in range(len(self.indices_vertices)):
+            self.get_indices_distances(index)
+        return {self.indices_vertices[source]: {self.indices_vertices[index]: distance for index, distance in distances.items()}
+                for source, distances in self.paths.items()}
+
+    def get_connectivity_component_hop_distances(self, cc):
+        """
+        Hop distances between all the vertices of a single connectivity component
+        :param cc: an iterable of the vertices of the connectivity component
+        :return: a dict mapping every vertex in cc to its single source hop distances (see get_hop_distances)
+        """
+        return {vertex: self.get_hop_distances(vertex=vertex) for vertex in cc}
+
+    def get_component_edges(self, cc):
+        """
+        :param cc: an iterable of the vertices of a connectivity component
+        :return: a tuple (vertices, rows, columns) where vertices is a list of the component vertices and
+        rows and columns are arrays of the component edges by the vertices positions in that list
+        """
+        vertices = list(cc)
+        local_indices = {self.vertices_indices_map[vertex]: i for i, vertex in enumerate(vertices)}
+        neighbors_indices = self.get_neighbors_indices()
+        rows = list()
+        columns = list()
+        for index, i in local_indices.items():
+            for neighbor in neighbors_indices[index]:
+                j = local_indices.get(neighbor)
+                if j is not None:
+                    rows.append(i)
+                    columns.append(j)
+        return vertices, np.array(rows, dtype=int), np.array(columns, dtype=int)
 
     def are_neighbors(self, v1, v2):
         v1_index = self.vertices_indices_map.get(v1)
         v2_index = self.vertices_indices_map.get(v2)
-        return self.adj[v1_index, v2_index] != 0 or self.adj[v2_index, v1_index] != 0
+        return self.adjacency.get_weight(v1_index, v2_index) != 0 or self.adjacency.get_weight(v2_index, v1_index) != 0
 
     def get_neighbors(self, vertex):
-        neighbors = set()
-        reverse_vertex_index_mapping = dict(map(reversed, self.vertices_indices_map.items()))
-        vertex_index = self.vertices_indices_map.get(vertex)
-        for index in np.where(self.adj[vertex_index] != 0)[0]:
-            neighbors.add(reverse_vertex_index_mapping.get(index))
-        return neighbors
+        return {self.indices_vertices[index] for index in self.adjacency.successors(self.vertices_indices_map[vertex])}
+
+    def get_adjacent_vertices(self, vertex):
+        """
+        :return: the vertices connected to vertex by an edge in any direction
+        """
+        if not self.directed:
+            return self.get_neighbors(vertex=vertex)
+        index = self.vertices_indices_map[vertex]
+        return {self.indices_vertices[i] for i in itertools.chain(self.adjacency.successors(index), self.adjacency.predecessors(index))}
 
     def get_path_length(self, v1, v2):
-        if len(self.paths) == 0:
-            self.paths = self.calculate_paths()
-        for n in self.paths:
-            v1_index = self.vertices_indices_map[v1]
-            v2_index = self.vertices_indices_map[v2]
-            if self.paths[n][v1_index, v2_index] != 0 or self.paths[n][v2_index, v1_index] != 0:
-                return n
-        return np.inf
+        v1_index = self.vertices_indices_map[v1]
+        v2_index = self.vertices_indices_map[v2]
+        distance = self.get_indices_distances(v1_index).get(v2_index, np.inf)
+        if self.directed:
+            distance = min(distance, self.get_indices_distances(v2_index).get(v1_index, np.inf))
+        return distance
 
     def get_connectivity_components(self):
-        if self.connectivity_components:
-            return self.connectivity_components
-        self.connectivity_components_map = dict()
-        for vertex in self.vertices:
-            if vertex.id in self.connectivity_components_map:
-                continue
-            cc = self.get_connectivity_component(vertex=vertex)
-            self.connectivity_components.add(cc)
-            for v in cc:
-                self.connectivity_components_map[v.id] = cc
-        return self.connectivity_components
+        return self.connectivity.get_components()
+
+    def get_sum_square_connectivity_components_sizes(self):
+        return self.connectivity.sum_square_sizes
 
     def get_connectivity_component(self, vertex, without_vertex=None):
         assert vertex is not without_vertex
-        if without_vertex is not None and vertex.id in self.connectivity_components_map:
-            return self.connectivity_components_map[vertex.id]
-        q = deque([], maxlen=len(self.vertices))
-        vertices_in_cc = set()
-        visited_vertices = set()
-        q.append(vertex)
+        if without_vertex is None:
+            return self.connectivity.get_component(vertex)
+        q = deque([vertex])
+        vertices_in_cc = {vertex}
         while len(q) > 0:
             v = q.popleft()
-            vertices_in_cc.add(v)
-            visited_vertices.add(v)
-            neighbors = self.get_neighbors(vertex=v)
-            if without_vertex and without_vertex in neighbors:
-                neighbors.remove(without_vertex)
-            connected_vertices = neighbors - visited_vertices
-            q.extend(connected_vertices)
+            for neighbor in self.get_adjacent_vertices(vertex=v):
+                if neighbor is not without_vertex and neighbor not in vertices_in_cc:
+                    vertices_in_cc.add(neighbor)
+                    q.append(neighbor)
         return frozenset(vertices_in_cc)
 
     def are_in_the_same_connectivity_component(self, v1, v2):
-        v1_cc = self.connectivity_components_map.get(v1.id)
-        return v1_cc and v2 in v1_cc
+        return self.connectivity.are_connected(v1, v2)
 
 
 class DiskGraph(Graph):
 
-    def __init__(self,  vertices, radius, metric=euclidean_metric, directed=False):
+    def __init__(self,  vertices, radius, metric=euclidean_metric, directed=False, adjacency_store=AdjacencySets, pairs=None,
+                 locations=None):
+        """
+        :param pairs: (optional) a tuple of two index arrays of all the pairs of vertices within the radius, already
+        known to the caller. The vertices should then be a list the pairs indices refer to
+        :param locations: (optional) an array of shape (vertices, 2) of the vertices locations when given the pairs
+        """
         self.radius = radius
         self.metric = metric
+        self.spatial_index = GridIndex(cell_size=radius)
         edges = set()
-        if vertices:
-            pairs = itertools.combinations(vertices, 2)
-            for v1, v2 in pairs:
-                if self.metric(v1.get('location'), v2.get('location')) <= self.radius:
-                    edges.add(Edge(v1=v1, v2=v2, weight=1))
-        super(DiskGraph, self).__init__(vertices=vertices, edges=edges, directed=directed)
+        if vertices and pairs is not None:
+            self.spatial_index.insert_many(vertices, [v.get('location') for v in vertices] if locations is None else locations)
+            for i, j in zip(*pairs):
+                edges.add(Edge(v1=vertices[j], v2=vertices[i], weight=1))
+            vertices = set(vertices)
+        elif vertices and self.metric is euclidean_metric:
+            # all the edges are found at once by the batched geometry kernel
+            vertices_list = list(vertices)
+            locations = np.array([v.get('location') for v in vertices_list], dtype=float)
+            self.spatial_index.insert_many(vertices_list, locations)
+            for i, j in zip(*get_pairs_within(locations, self.radius)):
+                edges.add(Edge(v1=vertices_list[j], v2=vertices_list[i], weight=1))
+        elif vertices:
+            for v1 in vertices:
+                for v2 in self.spatial_index.query(v1.get('location')):
+                    if self.metric(v1.get('location'), v2.get('location')) <= self.radius:
+                        edges.add(Edge(v1=v2, v2=v1, weight=1))
+                self.spatial_index.insert(v1, v1.get('location'))
+        super(DiskGraph, self).__init__(vertices=vertices, edges=edges, directed=directed, adjacency_store=adjacency_store)
+
+    def get_near_vertices(self, vertex):
+        location = vertex.get('location')
+        return [v for v in self.spatial_index.query(location) if v != vertex and self.metric(p1=v.get('location'), p2=location) <= self.radius]
 
     def add_vertex(self, vertex):
         vertex.set('halo', self.radius)
         super(DiskGraph, self).add_vertex(vertex=vertex)
-        near_vertices = filter(lambda v: 0 < self.metric(p1=v.get('location'), p2=vertex.get('location')) <= self.radius, self.vertices)
+        near_vertices = self.get_near_vertices(vertex=vertex)
+        self.spatial_index.insert(vertex, vertex.get('location'))
         for near_vertex in near_vertices:
             self.add_edge(near_vertex, vertex)
 
+    def remove_vertex(self, vertex):
+        self.spatial_index.remove(vertex)
+        super(DiskGraph, self).remove_vertex(vertex=vertex)
+
     def add_edge(self, v1, v2, weight=1):
         if self.metric(p1=v1.get('location'), p2=v2.get('location')) <= self.radius:
             super(DiskGraph, self).add_edge(v1=v1, v2=v2, weight=weight)
 
     def construct_edges(self, vertex):
-        existing_edges = filter(lambda e: e.v1 == vertex or e.v2 == vertex, self.edges)
-        near_vertices = filter(lambda v: 0 < self.metric(p1=v.get('location'), p2=vertex.get('location')) <= self.radius, self.vertices)
-        index = self.vertices_indices_map[vertex]
-        self.adj[index, :] = 0
-        self.adj[:, index] = 0
-        edges_to_be_removed = set(filter(lambda edge: self.metric(edge.v1.get('location'), edge.v2.get('location')) > self.radius, existing_edges))
+        """
+        Reconstructs the edges of a vertex after its location has changed
+        :param vertex: the vertex that was moved
+        """
+        self.spatial_index.move(vertex, vertex.get('location'))
+        neighbors = self.get_neighbors(vertex=vertex)
+        edges_to_be_removed = set(Edge(v1=neighbor, v2=vertex) for neighbor in neighbors
+                                  if self.metric(neighbor.get('location'), vertex.get('location')) > self.radius)
+
+        # new edges are added first so removing the old ones is less likely to split a connectivity component
+        for v in self.get_near_vertices(vertex=vertex):
+            if v not in neighbors:
+                super(DiskGraph, self).add_edge(v1=v, v2=vertex)
 
         for edge in edges_to_be_removed:
             super(DiskGraph, self).remove_edge(edge)
 
-        for v in near_vertices:
-            super(DiskGraph, self).add_edge(v1=v, v2=vertex)
-
     def as_json_dict(self, *args, **kwargs):
         res = {
             'radius': self.radius,
@@ -0,0 +1,100 @@
+from collections import deque
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import shortest_path
+
+from utils import metrics
+
+
+def bfs_hop_distances(neighbors, source, allowed=None):
+    """
+    Runs a breadth first search over an integer indexed adjacency list
+    :param neighbors: a sequence where neighbors[i] is an iterable of the indices adjacent to the index i
+    :param source: the index to start the search from
+    :param allowed: (optional) a set of indices the search is restricted to
+    :return: a dict mapping every reachable index to its hop distance from source
+    """
+    metrics.count(metrics.BFS_RUNS)
+    distances = {source: 0}
+    q = deque([source])
+    while q:
+        index = q.popleft()
+        next_distance = distances[index] + 1
+        for neighbor in neighbors[index]:
+            if neighbor in distances or (allowed is not None and neighbor not in allowed):
+                continue
+            distances[neighbor] = next_distance
+            q.append(neighbor)
+    return distances
+
+
+def all_pairs_hop_distances(neighbors, sources=None, allowed=None):
+    """
+    Runs a breadth first search from every source
+    :param neighbors: a sequence where neighbors[i] is an iterable of the indices adjacent to the index i
+    :param sources: (optional) the indices to run the search from. defaults to all indices
+    :param allowed: (optional) a set of indices the searches are restricted to
+    :return: a dict mapping every source to its hop distances dict (see bfs_hop_distances)
+    """
+    if sources is None:
+        sources = range(len(neighbors))
+    return {source: bfs_hop_distances(neighbors, source, allowed=allowed) for source in sources}
+
+
+def reciprocal_hop_distances_sum(size, rows, columns, sources, targets):
+    """
+    Runs a BFS from every source over an undirected graph and sums the reciprocal hop distances to all the targets.
+    Unreachable targets and the sources themselves are skipped
+    :param size: the amount of vertices of the graph (indexed 0 to size - 1)
+    :param rows: the first indices of the edges
+    :param columns: the second indices of the edges
+    :param sources: the indices to run the searches from
+    :param targets: the indices to sum the reciprocal distances to
+    :return: the sum of 1/d(source, target) over all the sources and targets
+    """
+    metrics.count(metrics.BFS_RUNS, len(sources))
+    graph = csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, columns)), shape=(size, size))
+    distances = shortest_path(graph, directed=False, unweighted=True, indices=sources)[:, targets]
+    reciprocals = np.zeros_like(distances)
+    np.divide(1.0, distances, out=reciprocals, where=np.isfinite(distances) & (distances > 0))
+    return float(reciprocals.sum())
+
+
+def betweenness_centrality(neighbors):
+    """
+    Brandes' algorithm over an unweighted integer indexed adjacency list: a BFS from every index counts the shortest
+    paths and the dependencies are accumulated back in the reverse BFS order. O(n * m) time and O(n + m) memory
+    :param neighbors: a sequence where neighbors[i] is an iterable of the indices adjacent to the index i
+    :return: an array of the (unnormalized) betweenness of every index. For undirected graphs every path is counted
+    from both of its ends
+    """
+    size = len(neighbors)
+    betweenness = np.zeros(size, dtype=float)
+    metrics.count(metrics.BFS_RUNS, size)
+    for source in range(size):
+        order = list()
+        predecessors = [list() for _ in range(size)]
+        sigma = [0] * size
+        sigma[source] = 1
+        distances = [-1] * size
+        distances[source] = 0
+        q = deque([source])
+        while q:
+            index = q.popleft()
+            order.append(index)
+            next_distance = distances[index] + 1
+            for neighbor in neighbors[index]:
+                if distances[neighbor] < 0:
+                    distances[neighbor] = next_distance
+                    q.append(neighbor)
+                if distances[neighbor] == next_distance:
+                    sigma[neighbor] += sigma[index]
+                    predecessors[neighbor].append(index)
+        dependencies = [0.0] * size
+        for index in reversed(order):
+            for predecessor in predecessors[index]:
+                dependencies[predecessor] += sigma[predecessor] / sigma[index] * (1 + dependencies[index])
+            if index != source:
+                betweenness[index] += dependencies[index]
+    return betweenness
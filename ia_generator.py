@@ -1,10 +1,9 @@
 import argparse
-import json
 import logging
 
 from sys import stdout
 
-from network.interest_areas import InterestAreaGenerator
+from network.interest_areas import FAMILIES, UNIFORM, InterestAreaGenerator
 from utils.utils import plot_interest_areas, str2bool
 
 formatter = logging.Formatter('%(asctime)s %(levelname)s: %(message)s')
@@ -35,18 +34,31 @@ def main():
     parser.add_argument('--show', dest='show', required=False, default=True, type=str2bool,
                         help='show the generated interest areas')
 
+    parser.add_argument('--family', dest='family', required=False, default=UNIFORM, choices=FAMILIES,
+                        help='how the interest areas are spread: {}'.format(', '.join(FAMILIES)))
+
+    parser.add_argument('--seed', dest='seed', required=False, type=int, default=None,
+                        help='a seed for a reproducible scenario')
+
+    parser.add_argument('--clusters', dest='clusters', required=False, type=int, default=None,
+                        help='the amount of clusters of the clustered family')
+
+    parser.add_argument('--corridors', dest='corridors', required=False, type=int, default=None,
+                        help='the amount of corridors of the corridor family')
+
     args = parser.parse_args()
     xlims = (-args.xlim, args.xlim)
     ylims = (-args.ylim, args.ylim)
-    logger.info("generating %s random interest areas in %s X %s", args.interest_areas_amount, xlims, ylims)
-    interest_areas = InterestAreaGenerator.random(amount=args.interest_areas_amount, xlims=xlims,
-                                                  ylims=ylims, allow_overlapping=args.allow_overlap)
-
-    logger.info("writing to %s", args.output)
-    with open(args.output, 'w') as file:
-        file.write(json.dumps([
-            ia.as_json_dict() for ia in interest_areas
-        ]))
+    logger.info("generating %s %s random interest areas in %s X %s into %s", args.interest_areas_amount, args.family,
+                xlims, ylims, args.output)
+    interest_areas = InterestAreaGenerator.generate(amount=args.interest_areas_amount, xlims=xlims, ylims=ylims,
+                                                    allow_overlapping=args.allow_overlap, family=args.family,
+                                                    seed=args.seed, clusters=args.clusters, corridors=args.corridors)
+    if args.show:
+        # only kept in memory to be shown, otherwise the interest areas are written while they are generated
+        interest_areas = list(interest_areas)
+    written = InterestAreaGenerator.to_file(interest_areas, args.output)
+    logger.info("wrote %s interest areas", written)
 
     if args.show:
         logger.info("showing result")
@@ -1,8 +1,30 @@
 import hashlib
+import math
+import os
 import uuid
 import json
 import random
+from functools import lru_cache
+
+import numpy as np
+from jsonschema import ValidationError
+from jsonschema.validators import validator_for
+
+from geometry.kernels import get_distances, get_intersecting_circles_mask, get_pairs_within
 from geometry.shapes import Circle
+from geometry.spatial import GridIndex
+from graphs.connectivity import get_components_indices
+
+MIN_RADIUS = 0.3
+MAX_RADIUS = 0.5
+CORRIDOR_WIDTH = 2.0
+
+UNIFORM = 'uniform'
+CLUSTERED = 'clustered'
+CORRIDOR = 'corridor'
+FAMILIES = (UNIFORM, CLUSTERED, CORRIDOR)
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'schemas', 'interest_areas_schema.json')
 
 
 class InterestArea(Circle):
@@ -25,47 +47,299 @@ class InterestArea(Circle):
         return InterestArea(center=tuple(ia_json['center']), radius=ia_json['radius'], name=ia_json['name'], is_hub=ia_json['is_hub'])
 
 
+@lru_cache(maxsize=1)
+def get_interest_areas_validator():
+    """
+    Compiles the interest areas schema once. Every interest area is validated on its own as it is read (so
+    newline delimited files are validated while they are streamed) and the array constraints of the schema are
+    checked by the loader, which also avoids the quadratic uniqueItems check of jsonschema
+    :return: a tuple (a validator of a single interest area, the interest areas schema)
+    """
+    with open(SCHEMA_PATH, 'r') as schema_file:
+        schema = json.load(schema_file)
+    validator_class = validator_for(schema)
+    validator_class.check_schema(schema)
+    return validator_class(schema['definitions']['interest_area']), schema
+
+
+@lru_cache(maxsize=32)
+def get_interest_areas_order(interest_areas):
+    """
+    A canonical order of a set of interest areas so all the networks built on the same interest areas index them alike
+    :param interest_areas: a frozenset of InterestArea objects
+    :return: a tuple (ordered interest areas tuple, dict mapping every interest area to its index)
+    """
+    ordered = tuple(sorted(interest_areas, key=lambda ia: (tuple(ia.center), ia.radius)))
+    return ordered, {ia: index for index, ia in enumerate(ordered)}
+
+
+@lru_cache(maxsize=32)
+def get_interest_areas_arrays(interest_areas):
+    """
+    :param interest_areas: a frozenset of InterestArea objects
+    :return: a tuple of arrays (centers of shape (n, 2), radii of shape (n,)) in the canonical order
+    (see get_interest_areas_order) for the batched geometry kernels
+    """
+    ordered, _ = get_interest_areas_order(interest_areas)
+    centers = np.array([ia.center for ia in ordered], dtype=float).reshape(-1, 2)
+    radii = np.array([ia.radius for ia in ordered], dtype=float)
+    centers.flags.writeable = False
+    radii.flags.writeable = False
+    return centers, radii
+
+
+def get_unique_item_key(item):
+    """
+    A hashable key of a json value that is equal for the values jsonschema considers equal in uniqueItems: numbers
+    are compared by value (1 equals 1.0), booleans are not numbers and the order of the keys of an object is ignored
+    :param item: a json value (as loaded by json.loads)
+    """
+    if isinstance(item, bool):
+        return 'boolean', item
+    if isinstance(item, (int, float)):
+        return 'number', item
+    if isinstance(item, dict):
+        return 'object', frozenset((key, get_unique_item_key(value)) for key, value in item.items())
+    if isinstance(item, list):
+        return 'array', tuple(get_unique_item_key(value) for value in item)
+    return 'value', item
+
+
+@lru_cache(maxsize=32)
+def get_reachable_components(interest_areas, radius=1):
+    """
+    Two sensors can only be adjacent if their interest areas are in reach of each other: the distance between the
+    interest areas centers is at most their radii and the graph radius together. The components of this reach relation
+    bound the connectivity components of every network of the interest areas
+    :param interest_areas: a frozenset of InterestArea objects
+    :param radius: the graph radius
+    :return: a list of the lists of the canonical indices (see get_interest_areas_order) of every reach component
+    """
+    centers, radii = get_interest_areas_arrays(interest_areas)
+    if not len(radii):
+        return list()
+    first, second = get_pairs_within(centers, radius + 2 * radii.max())
+    reach = get_distances(centers[first], centers[second]) <= radii[first] + radii[second] + radius
+    return get_components_indices(len(radii), first[reach].tolist(), second[reach].tolist())
+
+
+class InterestAreas(frozenset):
+    """
+    A frozenset of InterestArea objects holding their canonical order (see get_interest_areas_order) and arrays (see
+    get_interest_areas_arrays), so it is used like any set of interest areas and its arrays are used by the batched
+    geometry kernels right away
+    """
+
+    def __new__(cls, interest_areas=()):
+        instance = super(InterestAreas, cls).__new__(cls, interest_areas)
+        key = frozenset(instance)
+        instance.ordered, instance.indices = get_interest_areas_order(key)
+        instance.centers, instance.radii = get_interest_areas_arrays(key)
+        return instance
+
+    def __reduce__(self):
+        # the order and arrays are recomputed (or found in the caches) rather than pickled
+        return InterestAreas, (tuple(self),)
+
+
 class InterestAreaGenerator(object):
 
     @classmethod
-    def from_file(cls, file_name):
+    def from_file(cls, file_name, validate=False):
+        """
+        Loads interest areas from a json array file, or from a newline delimited json file (a file ending with .ndjson,
+        one interest area per line) that is streamed line by line. The file is parsed once, and with validate every
+        interest area is validated against the interest areas schema while it is read.
+        :param file_name: the interest areas file
+        :param validate: validate the file against the interest areas schema (raises a jsonschema.ValidationError)
+        :return: an InterestAreas object (the interest areas with their canonical order and arrays)
+        """
+        validator, schema = get_interest_areas_validator() if validate else (None, None)
+        unique_items = set()
         interest_areas = set()
+        hub_count = 0
+        amount = 0
+        for ia_dict in cls.read_file(file_name):
+            if validator is not None:
+                error = next(validator.iter_errors(ia_dict), None)
+                if error is not None:
+                    raise ValidationError('Interest area {} of {}: {}'.format(amount, file_name, error.message))
+                if schema.get('uniqueItems'):
+                    item = get_unique_item_key(ia_dict)
+                    if item in unique_items:
+                        raise ValidationError('Interest area {} of {} is not unique'.format(amount, file_name))
+                    unique_items.add(item)
+            amount += 1
+            is_hub = ia_dict.get('is_hub', False)
+            if is_hub:
+                hub_count += 1
+                ia_name = 'HUB_' + str(hub_count)
+            else:
+                ia_name = ia_dict.get('name', hashlib.sha256(str(uuid.uuid4()).encode()).hexdigest()[:6])
+            interest_areas.add(InterestArea(center=tuple(ia_dict['center']),
+                                            radius=ia_dict['radius'],
+                                            name=ia_name,
+                                            is_hub=is_hub))
+        if validator is not None and amount < schema.get('minItems', 0):
+            raise ValidationError('{} has {} interest areas, at least {} are needed'.format(file_name, amount, schema['minItems']))
+        return InterestAreas(interest_areas)
+
+    @staticmethod
+    def read_file(file_name):
+        """
+        :return: a generator of the interest areas dicts of a json array file or of a newline delimited json file
+        """
         with open(file_name, 'r') as file:
-            json_string = file.read()
-            if json_string:
-                ias_list = json.loads(json_string)
-                hub_count = 0
-                for ia_dict in ias_list:
-                    is_hub = ia_dict.get('is_hub', False)
-                    if is_hub:
-                        hub_count += 1
-                        ia_name = 'HUB_' + str(hub_count)
-                    else:
-                        ia_name = ia_dict.get('name', hashlib.sha256(str(uuid.uuid4()).encode()).hexdigest()[:6])
-                    interest_areas.add(InterestArea(center=tuple(ia_dict['center']),
-                                                    radius=ia_dict['radius'],
-                                                    name=ia_name,
-                                                    is_hub=is_hub))
-        return interest_areas
+            if file_name.endswith('.ndjson'):
+                for line in file:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                json_string = file.read()
+                if json_string:
+                    ias_list = json.loads(json_string)
+                    if not isinstance(ias_list, list):
+                        raise ValidationError('{} does not hold a json array of interest areas'.format(file_name))
+                    yield from ias_list
 
     @classmethod
-    def random(cls, amount, xlims, ylims, allow_overlapping):
-        interest_areas = set()
-        interest_area_id = 1
-        while len(interest_areas) < amount:
-            ia = InterestArea(center=((xlims[0] + 1) + (xlims[1] - 1 - xlims[0] - 1) * random.random(),
-                                      (ylims[0] + 1) + (ylims[1] - 1 - ylims[0] - 1) * random.random()),
-                              radius=0.3 + 0.2 * random.random(), name='IA-' + str(interest_area_id))
-            if not allow_overlapping:
-                if not any(other.intersects(ia) for other in interest_areas):
-                    interest_areas.add(ia)
-                    interest_area_id += 1
+    def random(cls, amount, xlims, ylims, allow_overlapping, family=UNIFORM, seed=None, clusters=None, corridors=None):
+        """
+        :return: a set of random interest areas (see generate)
+        """
+        return set(cls.generate(amount=amount, xlims=xlims, ylims=ylims, allow_overlapping=allow_overlapping,
+                                family=family, seed=seed, clusters=clusters, corridors=corridors))
+
+    @classmethod
+    def generate(cls, amount, xlims, ylims, allow_overlapping, family=UNIFORM, seed=None, clusters=None, corridors=None,
+                 max_attempts=1000):
+        """
+        Generates random interest areas one at a time, so very large scenarios can be written while they are generated.
+        Without overlapping, the accepted interest areas are kept in a spatial hash of cells as wide as the largest
+        interest area, so every candidate is only tested against the interest areas of the 3x3 cells around it (all at
+        once, see overlaps).
+        One of the interest areas (chosen at random) is the hub.
+        :param amount: the amount of interest areas
+        :param xlims: the (min, max) limits of the x axis
+        :param ylims: the (min, max) limits of the y axis
+        :param allow_overlapping: can the interest areas overlap
+        :param family: how the centers are spread (see get_center_sampler)
+        :param seed: (optional) a seed for a reproducible scenario. defaults to the global random state
+        :param clusters: (optional) the amount of clusters of the clustered family
+        :param corridors: (optional) the amount of corridors of the corridor family
+        :param max_attempts: the amount of overlapping candidates rejected before giving up on an interest area
+        :return: a generator of InterestArea objects
+        """
+        rng = random if seed is None else random.Random(seed)
+        sample_center = cls.get_center_sampler(family=family, rng=rng, xlims=xlims, ylims=ylims, amount=amount,
+                                               clusters=clusters, corridors=corridors)
+        spatial_index = GridIndex(cell_size=2 * MAX_RADIUS)
+        hub = rng.randrange(amount) if amount > 0 else None
+        for interest_area_id in range(1, amount + 1):
+            for _ in range(max_attempts):
+                ia = InterestArea(center=sample_center(), radius=MIN_RADIUS + (MAX_RADIUS - MIN_RADIUS) * rng.random(),
+                                  name='IA-' + str(interest_area_id))
+                if allow_overlapping or not cls.overlaps(ia, spatial_index.query(ia.center)):
+                    break
             else:
-                interest_areas.add(ia)
-                interest_area_id += 1
+                raise ValueError('Could not place interest area {} of {} without overlapping in {} attempts. '
+                                 'Please use larger limits or allow overlapping'.format(interest_area_id, amount, max_attempts))
+            if not allow_overlapping:
+                spatial_index.insert(ia, ia.center)
+            if interest_area_id - 1 == hub:
+                ia.name = 'HUB'
+                ia.is_hub = True
+            yield ia
+
+    @staticmethod
+    def overlaps(interest_area, others):
+        """
+        :param interest_area: an InterestArea object
+        :param others: a list of InterestArea objects
+        :return: whether the interest area intersects any of the others
+        """
+        if not others:
+            return False
+        centers = np.array([other.center for other in others], dtype=float)
+        radii = np.array([other.radius for other in others], dtype=float)
+        return bool(get_intersecting_circles_mask(centers, radii, interest_area.center, interest_area.radius).any())
+
+    @staticmethod
+    def get_center_sampler(family, rng, xlims, ylims, amount, clusters=None, corridors=None):
+        """
+        Every family spreads the centers within the limits (keeping a margin of 1 from the edges) differently:
+        uniform - all over the plane.
+        clustered - normally around cluster centers spread all over the plane (one cluster per 100 interest areas by
+        default).
+        corridor - uniformly along bands of width CORRIDOR_WIDTH crossing the plane from its left edge to its right edge
+        (3 corridors by default).
+        :param rng: the random state (the random module or a random.Random object)
+        :return: a function returning a random center
+        """
+        x_min, x_max = xlims[0] + 1, xlims[1] - 1
+        y_min, y_max = ylims[0] + 1, ylims[1] - 1
+
+        def is_in_limits(x, y):
+            return x_min <= x <= x_max and y_min <= y <= y_max
+
+        def sample_uniform():
+            return x_min + (x_max - x_min) * rng.random(), y_min + (y_max - y_min) * rng.random()
+
+        if family == UNIFORM:
+            return sample_uniform
+
+        if family == CLUSTERED:
+            clusters_centers = [sample_uniform() for _ in range(clusters or max(1, amount // 100))]
+            spread = math.sqrt((x_max - x_min) * (y_max - y_min) / len(clusters_centers)) / 4
+
+            def sample_clustered():
+                while True:
+                    x_center, y_center = clusters_centers[rng.randrange(len(clusters_centers))]
+                    x, y = rng.gauss(x_center, spread), rng.gauss(y_center, spread)
+                    if is_in_limits(x, y):
+                        return x, y
+
+            return sample_clustered
+
+        if family == CORRIDOR:
+            segments = [((x_min, y_min + (y_max - y_min) * rng.random()), (x_max, y_min + (y_max - y_min) * rng.random()))
+                        for _ in range(corridors or 3)]
+
+            def sample_corridor():
+                while True:
+                    (x1, y1), (x2, y2) = segments[rng.randrange(len(segments))]
+                    length = math.hypot(x2 - x1, y2 - y1) or 1
+                    t = rng.random()
+                    offset = CORRIDOR_WIDTH * (rng.random() - 0.5)
+                    x = x1 + t * (x2 - x1) - offset * (y2 - y1) / length
+                    y = y1 + t * (y2 - y1) + offset * (x2 - x1) / length
+                    if is_in_limits(x, y):
+                        return x, y
+
+            return sample_corridor
 
-        hub = random.sample(interest_areas, 1)[0]
-        hub.name = 'HUB'
-        hub.is_hub = True
+        raise ValueError('Unknown interest areas family {}. Please use one of {}'.format(family, FAMILIES))
 
-        return interest_areas
+    @staticmethod
+    def to_file(interest_areas, file_name):
+        """
+        Writes interest areas one at a time, so a generator of interest areas is never held in memory.
+        Files ending with .ndjson get one interest area json per line, any other file gets a json array
+        :param interest_areas: an iterable of InterestArea objects
+        :param file_name: the output file
+        :return: the amount of interest areas written
+        """
+        written = 0
+        ndjson = file_name.endswith('.ndjson')
+        with open(file_name, 'w') as file:
+            if not ndjson:
+                file.write('[')
+            for ia in interest_areas:
+                if ndjson:
+                    file.write(json.dumps(ia.as_json_dict()) + '\n')
+                else:
+                    file.write((', ' if written else '') + json.dumps(ia.as_json_dict()))
+                written += 1
+            if not ndjson:
+                file.write(']')
+        return written
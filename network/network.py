@@ -1,20 +1,37 @@
 import hashlib
-import itertools
 import math
 import uuid
 import random
 
+import numpy as np
+
+from geometry.kernels import get_intersecting_circles_mask, get_lenses_centers, get_pairs_within
 from geometry.shapes import Circle
-from graphs.graphs import Vertex, DiskGraph
-from network.interest_areas import InterestArea
+from graphs.graphs import Vertex
+from network.interest_areas import InterestArea, get_interest_areas_order
+from network.sensors import SensorArrays, SensorsGraph
 
 
 class ADGN(object):
 
     def __init__(self, interest_areas, sensors=None):
+        """
+        :param interest_areas: the interest areas of the network
+        :param sensors: (optional) vertices to copy into the network sensors arrays
+        """
         self.interest_areas = set(interest_areas)
-        self.graph = DiskGraph(vertices=sensors, radius=1)
-        self.relays = set()
+        interest_areas_order, interest_areas_indices = get_interest_areas_order(frozenset(self.interest_areas))
+        self.sensors = SensorArrays(interest_areas=interest_areas_order, interest_areas_indices=interest_areas_indices,
+                                    capacity=max(16, len(sensors) if sensors else len(interest_areas_order)))
+        vertices = set(self.sensors.copy(vertex) for vertex in sensors) if sensors else None
+        self.graph = SensorsGraph(sensors=self.sensors, vertices=vertices, radius=1)
+
+    @property
+    def relays(self):
+        """
+        :return: a set of the ids of the relays
+        """
+        return set(self.sensors.sensors[index].id for index in np.flatnonzero(self.sensors.relays[:len(self.sensors)]))
 
     def as_json_dict(self, *args, **kwargs):
         res = {
@@ -26,9 +43,25 @@ class ADGN(object):
     @classmethod
     def from_json(cls, network_json):
         interest_areas = {InterestArea.from_json(ia_json) for ia_json in network_json['interest_areas']}
-        graph = DiskGraph.from_json(network_json['graph'])
-        adgn = ADGN(interest_areas=interest_areas, sensors=graph.vertices)
-        adgn.relays = set(filter(lambda v: v.get('is_relay'), graph.vertices))
+        vertices = {Vertex.from_json(vertex_json) for vertex_json in network_json['graph'].get('vertices')}
+        return ADGN(interest_areas=interest_areas, sensors=vertices)
+
+    def pack(self):
+        """
+        :return: a compact, cheap to pickle, representation of the network sensors (see SensorArrays.pack)
+        """
+        return self.sensors.pack()
+
+    @classmethod
+    def unpack(cls, interest_areas, packed):
+        """
+        :param interest_areas: the interest areas of the network
+        :param packed: a packed network (see pack)
+        :return: an ADGN object
+        """
+        adgn = ADGN(interest_areas=interest_areas)
+        sensors = adgn.sensors.unpack(packed)
+        adgn.graph = SensorsGraph(sensors=adgn.sensors, vertices=set(sensors), radius=adgn.graph.radius)
         return adgn
 
     @staticmethod
@@ -49,8 +82,7 @@ class ADGN(object):
         return True
 
     def randomize(self):
-        sensor_id = 0
-        for interest_area in self.interest_areas:
+        for sensor_id, interest_area in enumerate(self.sensors.interest_areas):
             data = {
                 'interest_area': interest_area,
                 'is_relay': False
@@ -60,11 +92,78 @@ class ADGN(object):
                                                                                       mid_center=interest_area.is_hub),
                                         **data)
             self.graph.add_vertex(sensor)
-            sensor_id += 1
 
-    @staticmethod
-    def create_sensor(vertex_id, location, *args, **kwars):
-        return Vertex(vertex_id, location=location, **kwars)
+    @classmethod
+    def from_interest_areas_locations(cls, interest_areas, locations, pairs=None):
+        """
+        Creates a network with a sensor in every interest area (like randomize) at given locations
+        :param interest_areas: the interest areas of the network
+        :param locations: an array of shape (interest areas, 2) of the sensors locations by interest area index
+        :param pairs: (optional) a tuple of two interest area index arrays of all the pairs of sensors within the
+        graph radius (see graphs.graphs.DiskGraph)
+        :return: an ADGN object
+        """
+        adgn = ADGN(interest_areas=interest_areas)
+        amount = len(adgn.sensors.interest_areas)
+        sensors = adgn.sensors.unpack((list(range(amount)), locations, np.arange(amount), np.zeros(amount, dtype=bool),
+                                       np.full(amount, adgn.graph.radius, dtype=float)))
+        locations = adgn.sensors.locations[:amount]
+        if pairs is None:
+            pairs = get_pairs_within(locations, adgn.graph.radius)
+        adgn.graph = SensorsGraph(sensors=adgn.sensors, vertices=sensors, radius=adgn.graph.radius, pairs=pairs,
+                                  locations=locations)
+        return adgn
+
+    def get_interest_areas_sensors(self):
+        """
+        :return: an array of the index (in the sensors arrays) of the sensor of every interest area (-1 for none)
+        """
+        size = len(self.sensors)
+        interest_area_indices = self.sensors.interest_area_indices[:size]
+        sensors_mask = ~self.sensors.relays[:size] & (interest_area_indices >= 0)
+        sensors = np.full(len(self.sensors.interest_areas), -1, dtype=np.int64)
+        sensors[interest_area_indices[sensors_mask]] = np.flatnonzero(sensors_mask)
+        return sensors
+
+    def get_interest_areas_locations(self):
+        """
+        :return: an array of shape (interest areas, 2) of the sensors locations by interest area index (NaN for an
+        interest area with no sensor)
+        """
+        sensors = self.get_interest_areas_sensors()
+        locations = np.full(shape=(len(sensors), 2), fill_value=np.nan, dtype=float)
+        locations[sensors >= 0] = self.sensors.locations[sensors[sensors >= 0]]
+        return locations
+
+    def get_interest_areas_pairs(self):
+        """
+        :return: a tuple of two interest area index arrays (first, second) with first < second of the edges between
+        the sensors (relays edges are left out)
+        """
+        interest_area_indices = self.sensors.interest_area_indices
+        relays = self.sensors.relays
+        pairs = np.array([(edge.v1.index, edge.v2.index) for edge in self.graph.edges], dtype=np.int64).reshape(-1, 2)
+        pairs = pairs[~relays[pairs].any(axis=1)]
+        pairs = interest_area_indices[pairs]
+        pairs = pairs[(pairs >= 0).all(axis=1)]
+        return pairs.min(axis=1), pairs.max(axis=1)
+
+    def move_sensors(self, interest_area_indices, locations):
+        """
+        Moves the sensors of some interest areas and reconstructs their edges
+        :param interest_area_indices: an array of the interest area indices of the moved sensors
+        :param locations: an array of shape (moved sensors, 2) of the new locations
+        """
+        sensors = self.get_interest_areas_sensors()
+        for index, location in zip(sensors[interest_area_indices], np.asarray(locations, dtype=float).tolist()):
+            if index < 0:
+                continue
+            sensor = self.sensors.sensors[index]
+            sensor.set('location', tuple(location))
+            self.graph.construct_edges(vertex=sensor)
+
+    def create_sensor(self, vertex_id, location, *args, **kwars):
+        return self.sensors.add(vertex_id, location=location, **kwars)
 
     def move_sensor(self, sensor):
         if sensor not in self.graph.vertices:
@@ -84,11 +183,11 @@ class ADGN(object):
 
     def get_random_sensor(self, include_relays=True):
         if include_relays:
-            return random.sample(self.graph.vertices, 1)[0]
+            return random.choice(self.sensors.sensors)
         else:
-            non_relays = set(filter(lambda sensor: not sensor.get('is_relay', False), self.graph.vertices))
-            if non_relays:
-                return random.sample(non_relays, 1)[0]
+            non_relays = np.flatnonzero(~self.sensors.relays[:len(self.sensors)])
+            if len(non_relays):
+                return self.sensors.sensors[random.choice(non_relays)]
             return None
 
     @staticmethod
@@ -97,8 +196,8 @@ class ADGN(object):
         def get_vertex_halo(v):
             return Circle(center=v.get('location'), radius=v.get('halo'))
 
-        cc1_halo = map(lambda sensor: get_vertex_halo(sensor), cc1)
-        cc2_halo = map(lambda sensor: get_vertex_halo(sensor), cc2)
+        cc1_halo = [get_vertex_halo(sensor) for sensor in cc1]
+        cc2_halo = [get_vertex_halo(sensor) for sensor in cc2]
         intersecting_circles = set()
         visited_circles = set()
         for c1 in cc1_halo:
@@ -109,10 +208,51 @@ class ADGN(object):
                     intersecting_circles.add((c1, c2))
         return intersecting_circles
 
+    def get_halos_intersections(self, vertices=None):
+        """
+        Finds the pairs of sensors of different connectivity components whose halos intersect. Only the sensors the
+        graph spatial index finds within reach are compared, and the exact test runs on all the candidates at once
+        :param vertices: (optional) only find the pairs of these sensors. defaults to all the pairs of the network
+        :return: a list of (sensor, sensor, lens center) tuples (see geometry.kernels.get_lenses_centers)
+        """
+        size = len(self.sensors)
+        halos = self.sensors.halos[:size]
+        if not size or np.isnan(halos).all():
+            return []
+        max_halo = np.nanmax(halos)
+        components_ids = self.graph.connectivity.components_ids
+        first, second = list(), list()
+        for vertex in (self.sensors.sensors if vertices is None else vertices):
+            halo = halos[vertex.index]
+            if np.isnan(halo):
+                continue
+            component_id = components_ids[vertex]
+            for near_vertex in self.graph.spatial_index.query(vertex.get('location'), radius=halo + max_halo):
+                if (vertices is not None or near_vertex.index > vertex.index) and components_ids[near_vertex] != component_id:
+                    first.append(vertex.index)
+                    second.append(near_vertex.index)
+        if not first:
+            return []
+        first = np.array(first)
+        second = np.array(second)
+        # the spatial index cells are sets, the pairs are sorted so relay placement does not depend on their order
+        order = np.lexsort((second, first))
+        first = first[order]
+        second = second[order]
+        locations = self.sensors.locations[:size]
+        intersecting = get_intersecting_circles_mask(locations[first], halos[first], locations[second], halos[second])
+        first = first[intersecting]
+        second = second[intersecting]
+        centers = get_lenses_centers(locations[first], halos[first], locations[second], halos[second])
+        sensors = self.sensors.sensors
+        return [(sensors[i], sensors[j], (float(x), float(y))) for i, j, (x, y) in zip(first, second, centers)]
+
     def get_intersecting_connectivity_components(self):
-        intersecting_connectivity_components = set(
-            filter(lambda pair: self.get_connectivity_components_halos_intersections(cc1=pair[0], cc2=pair[1]),
-                   itertools.combinations(self.graph.get_connectivity_components(), 2)))
+        connectivity = self.graph.connectivity
+        intersecting_connectivity_components = set()
+        for sensor1, sensor2, _ in self.get_halos_intersections():
+            component_ids = sorted((connectivity.components_ids[sensor1], connectivity.components_ids[sensor2]))
+            intersecting_connectivity_components.add(tuple(connectivity.get_component_by_id(component_id) for component_id in component_ids))
         return frozenset(intersecting_connectivity_components)
 
     def add_relay(self, location, *args, **kwargs):
@@ -122,6 +262,27 @@ class ADGN(object):
             'location': location
         }
         data.update(**kwargs)
-        vertex = Vertex(random_vertex_id, **data)
+        vertex = self.sensors.add(random_vertex_id, **data)
         self.graph.add_vertex(vertex)
-        self.relays.add(random_vertex_id)
+        return vertex
+
+    def add_relays(self):
+        """
+        Adds relays until the halos of no two connectivity components intersect. Every relay is placed in the lens of a
+        random pair of intersecting halos of different components, which merges the two components.
+        Components only merge while relays are added, so the pairs are searched once and afterwards only the pairs of
+        every new relay are searched for. Pairs whose components were merged since are skipped
+        :return: the added relays
+        """
+        candidates = self.get_halos_intersections()
+        relays = list()
+        while candidates:
+            index = random.randrange(len(candidates))
+            candidates[index], candidates[-1] = candidates[-1], candidates[index]
+            sensor1, sensor2, location = candidates.pop()
+            if self.graph.are_in_the_same_connectivity_component(sensor1, sensor2):
+                continue
+            relay = self.add_relay(location=location)
+            relays.append(relay)
+            candidates.extend(self.get_halos_intersections(vertices=[relay]))
+        return relays
@@ -0,0 +1,230 @@
+import math
+
+import numpy as np
+
+from graphs.graphs import DiskGraph, Vertex
+
+
+class Sensor(object):
+    """
+    A lightweight view of a single sensor stored in a SensorArrays. Gives the same access as a Vertex
+    (id, get, set, clone and json serialization) without holding a metadata dict of its own.
+    """
+
+    __slots__ = ('id', 'store', 'index')
+
+    def __init__(self, vertex_id, store, index):
+        self.id = vertex_id
+        self.store = store
+        self.index = index
+
+    def get(self, key, default=None):
+        return self.store.get(self.index, key, default)
+
+    def set(self, key, data):
+        self.store.set(self.index, key, data)
+
+    @property
+    def metadata(self):
+        return self.store.get_metadata(self.index)
+
+    def clone(self):
+        return Vertex(self.id, **self.metadata)
+
+    def __eq__(self, other):
+        return type(self) == type(other) and self.id == other.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return "Sensor [id: " + str(self.id) + "]"
+
+    def as_json_dict(self, *args, **kwargs):
+        return {
+            'id': self.id,
+            'location': self.get('location'),
+            'is_relay': self.get('is_relay', False)
+        }
+
+
+class SensorArrays(object):
+    """
+    Structure of arrays holding all the sensors (and relays) of a single network in contiguous memory:
+    float coordinates, the index of every sensor's interest area (-1 for none), a relays mask and the halos radii.
+    Arrays grow by doubling their capacity.
+    """
+
+    def __init__(self, interest_areas, interest_areas_indices, capacity=16):
+        """
+        :param interest_areas: the ordered interest areas the sensors interest area indices refer to
+        :param interest_areas_indices: a dict mapping every interest area to its index in interest_areas
+        :param capacity: the initial capacity of the arrays
+        """
+        self.interest_areas = interest_areas
+        self.interest_areas_indices = interest_areas_indices
+        self.size = 0
+        self.locations = np.zeros(shape=(capacity, 2), dtype=float)
+        self.interest_area_indices = np.full(shape=capacity, fill_value=-1, dtype=np.int32)
+        self.relays = np.zeros(shape=capacity, dtype=bool)
+        self.halos = np.full(shape=capacity, fill_value=np.nan, dtype=float)
+        self.sensors = []
+        self.extras = dict()
+
+    def __len__(self):
+        return self.size
+
+    def ensure_capacity(self, capacity):
+        if capacity <= len(self.relays):
+            return
+        capacity = max(capacity, 2 * len(self.relays))
+        size = self.size
+
+        def grow(array, fill_value):
+            grown = np.full(shape=(capacity,) + array.shape[1:], fill_value=fill_value, dtype=array.dtype)
+            grown[:size] = array[:size]
+            return grown
+
+        self.locations = grow(self.locations, 0)
+        self.interest_area_indices = grow(self.interest_area_indices, -1)
+        self.relays = grow(self.relays, False)
+        self.halos = grow(self.halos, np.nan)
+
+    def add(self, vertex_id, location, interest_area=None, is_relay=False, halo=None, **kwargs):
+        """
+        :return: the Sensor view of the added sensor
+        """
+        self.ensure_capacity(self.size + 1)
+        index = self.size
+        self.size += 1
+        sensor = Sensor(vertex_id, store=self, index=index)
+        self.sensors.append(sensor)
+        self.set(index, 'location', location)
+        self.set(index, 'interest_area', interest_area)
+        self.set(index, 'is_relay', is_relay)
+        self.set(index, 'halo', halo)
+        for key, data in kwargs.items():
+            self.set(index, key, data)
+        return sensor
+
+    def remove(self, sensor):
+        """
+        Removes a sensor by moving the last sensor into its slot, so the arrays stay contiguous. The Sensor view of the
+        moved sensor is updated to its new index, the view of the removed sensor should not be used afterwards
+        """
+        index = sensor.index
+        if index >= self.size or self.sensors[index] is not sensor:
+            raise ValueError('Sensor {} is not in the arrays'.format(sensor.id))
+        last = self.size - 1
+        moved = self.sensors.pop()
+        self.extras.pop(index, None)
+        if index != last:
+            self.locations[index] = self.locations[last]
+            self.interest_area_indices[index] = self.interest_area_indices[last]
+            self.relays[index] = self.relays[last]
+            self.halos[index] = self.halos[last]
+            if last in self.extras:
+                self.extras[index] = self.extras.pop(last)
+            moved.index = index
+            self.sensors[index] = moved
+        self.locations[last] = 0
+        self.interest_area_indices[last] = -1
+        self.relays[last] = False
+        self.halos[last] = np.nan
+        self.size = last
+
+    def copy(self, vertex):
+        """
+        Adds a copy of a vertex (or a sensor of another SensorArrays) to the arrays
+        :return: the Sensor view of the copy
+        """
+        if isinstance(vertex, Sensor) and vertex.store.interest_areas is self.interest_areas:
+            source = vertex.store
+            sensor = self.add(vertex.id, location=source.locations[vertex.index], is_relay=source.relays[vertex.index])
+            self.interest_area_indices[sensor.index] = source.interest_area_indices[vertex.index]
+            self.halos[sensor.index] = source.halos[vertex.index]
+            if vertex.index in source.extras:
+                self.extras[sensor.index] = dict(source.extras[vertex.index])
+            return sensor
+        return self.add(vertex.id, **vertex.metadata)
+
+    def pack(self):
+        """
+        :return: a compact tuple (ids, locations, interest area indices, relays mask, halos) of the sensors
+        """
+        size = self.size
+        return ([sensor.id for sensor in self.sensors], self.locations[:size].copy(), self.interest_area_indices[:size].copy(),
+                self.relays[:size].copy(), self.halos[:size].copy())
+
+    def unpack(self, packed):
+        """
+        Adds all the sensors of a packed tuple (see pack) to the arrays
+        :return: the Sensor views of the added sensors
+        """
+        ids, locations, interest_area_indices, relays, halos = packed
+        start = self.size
+        end = start + len(ids)
+        self.ensure_capacity(end)
+        self.locations[start:end] = locations
+        self.interest_area_indices[start:end] = interest_area_indices
+        self.relays[start:end] = relays
+        self.halos[start:end] = halos
+        sensors = [Sensor(vertex_id, store=self, index=index) for index, vertex_id in enumerate(ids, start)]
+        self.sensors.extend(sensors)
+        self.size = end
+        return sensors
+
+    def get(self, index, key, default=None):
+        if key == 'location':
+            return tuple(self.locations[index].tolist())
+        if key == 'interest_area':
+            ia_index = self.interest_area_indices[index]
+            return self.interest_areas[ia_index] if ia_index >= 0 else default
+        if key == 'is_relay':
+            return bool(self.relays[index])
+        if key == 'halo':
+            halo = self.halos[index]
+            return default if math.isnan(halo) else float(halo)
+        return self.extras.get(index, dict()).get(key, default)
+
+    def set(self, index, key, data):
+        if key == 'location':
+            self.locations[index] = data
+        elif key == 'interest_area':
+            self.interest_area_indices[index] = -1 if data is None else self.interest_areas_indices[data]
+        elif key == 'is_relay':
+            self.relays[index] = bool(data)
+        elif key == 'halo':
+            self.halos[index] = np.nan if data is None else data
+        else:
+            self.extras.setdefault(index, dict())[key] = data
+
+    def get_metadata(self, index):
+        metadata = {
+            'location': self.get(index, 'location'),
+            'interest_area': self.get(index, 'interest_area'),
+            'is_relay': self.get(index, 'is_relay'),
+            'halo': self.get(index, 'halo')
+        }
+        metadata.update(self.extras.get(index, dict()))
+        return metadata
+
+
+class SensorsGraph(DiskGraph):
+    """
+    The disk graph of the sensors of a SensorArrays. Removing a vertex also removes its sensor from the arrays, so the
+    graph and the arrays always hold the same sensors
+    """
+
+    def __init__(self, sensors, vertices, radius, **kwargs):
+        """
+        :param sensors: the SensorArrays the vertices are the Sensor views of
+        """
+        self.sensors = sensors
+        super(SensorsGraph, self).__init__(vertices=vertices, radius=radius, **kwargs)
+
+    def remove_vertex(self, vertex):
+        if vertex not in self.vertices_indices_map:
+            return
+        super(SensorsGraph, self).remove_vertex(vertex=vertex)
+        self.sensors.remove(vertex)
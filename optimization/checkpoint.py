@@ -0,0 +1,163 @@
+import json
+import os
+import random
+import threading
+
+import numpy as np
+
+from network.interest_areas import get_interest_areas_arrays
+from network.network import ADGN
+
+
+def pack_population(agents):
+    """
+    :param agents: a list of Agent objects
+    :return: a dict of arrays holding all the agents networks (see ADGN.pack) and fitness values
+    """
+    packed_networks = [agent.network.pack() for agent in agents]
+    ids = [vertex_id for packed_network in packed_networks for vertex_id in packed_network[0]]
+    return {
+        'sizes': np.array([len(packed_network[0]) for packed_network in packed_networks], dtype=np.int64),
+        'ids': np.array([str(vertex_id) for vertex_id in ids], dtype=str),
+        'numeric_ids': np.array([isinstance(vertex_id, (int, np.integer)) for vertex_id in ids], dtype=bool),
+        'locations': np.concatenate([packed_network[1] for packed_network in packed_networks]),
+        'interest_area_indices': np.concatenate([packed_network[2] for packed_network in packed_networks]),
+        'relays': np.concatenate([packed_network[3] for packed_network in packed_networks]),
+        'halos': np.concatenate([packed_network[4] for packed_network in packed_networks]),
+        'fitness': np.array([agent.fitness for agent in agents], dtype=float),
+    }
+
+
+def unpack_population(interest_areas, population):
+    """
+    :param interest_areas: the interest areas of the networks
+    :param population: a dict of arrays (see pack_population)
+    :return: a list of Agent objects
+    """
+    from optimization.ga import Agent
+    ids = [int(vertex_id) if numeric else str(vertex_id) for vertex_id, numeric in zip(population['ids'], population['numeric_ids'])]
+    agents = list()
+    start = 0
+    for size, fitness in zip(population['sizes'], population['fitness']):
+        end = start + int(size)
+        packed_network = (ids[start:end], population['locations'][start:end], population['interest_area_indices'][start:end],
+                          population['relays'][start:end], population['halos'][start:end])
+        agent = Agent(network=ADGN.unpack(interest_areas=interest_areas, packed=packed_network))
+        agent.fitness = float(fitness)
+        agents.append(agent)
+        start = end
+    return agents
+
+
+def get_interest_areas_array(interest_areas):
+    """
+    :return: an array of shape (interest areas, 3) of the centers and radii in the canonical order
+    """
+    centers, radii = get_interest_areas_arrays(frozenset(interest_areas))
+    return np.column_stack((centers, radii))
+
+
+class Checkpointer(object):
+    """
+    Saves the state of a GA (population, fitness, random states, statistics, metrics and generation) every
+    interval generations into an npz file. The state is copied on the calling thread and written on a background
+    thread into a temporary file that atomically replaces the previous checkpoint, so a crash while writing never
+    leaves a broken checkpoint.
+    """
+
+    def __init__(self, path, interval=10):
+        """
+        :param path: the checkpoint file path
+        :param interval: the amount of generations between checkpoints
+        """
+        self.path = path
+        self.interval = interval
+        self.thread = None
+
+    def checkpoint(self, ga, generation, force=False):
+        """
+        Saves a checkpoint of the GA if the generation is a checkpoint generation
+        :param ga: the GA
+        :param generation: the last generation the GA completed
+        :param force: save the checkpoint regardless of the interval
+        """
+        if not force and (not self.interval or generation % self.interval):
+            return
+        arrays = self.get_state(ga, generation)
+        self.wait()
+        self.thread = threading.Thread(target=self.write, args=(arrays,), daemon=True)
+        self.thread.start()
+
+    def wait(self):
+        """
+        Waits for the checkpoint being written
+        """
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def write(self, arrays):
+        temporary_path = '{}.tmp'.format(self.path)
+        with open(temporary_path, 'wb') as file:
+            np.savez(file, **arrays)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, self.path)
+
+    @staticmethod
+    def get_state(ga, generation):
+        arrays = {'population_{}'.format(key): value for key, value in pack_population(ga.agents).items()}
+        arrays.update({'fittest_{}'.format(key): value for key, value in pack_population([ga.fittest_agent]).items()})
+        version, python_state, gauss_next = random.getstate()
+        _, numpy_keys, numpy_position, numpy_has_gauss, numpy_cached_gaussian = np.random.get_state()
+        arrays.update({
+            'generation': np.array(generation),
+            'run_id': np.array(str(ga.run_id)),
+            'interest_areas': get_interest_areas_array(ga.interest_areas),
+            'python_random_state': np.array(python_state, dtype=np.int64),
+            'python_random_version': np.array(version),
+            'python_random_gauss_next': np.array(np.nan if gauss_next is None else gauss_next),
+            'numpy_random_keys': numpy_keys,
+            'numpy_random_position': np.array(numpy_position),
+            'numpy_random_gauss': np.array((numpy_has_gauss, numpy_cached_gaussian), dtype=float),
+            'metrics': np.array(json.dumps(ga.metrics.records)),
+            'statistics_names': np.array(list(ga.statistics.statistics.keys()), dtype=str),
+        })
+        for index, values in enumerate(ga.statistics.statistics.values()):
+            arrays['statistics_{}'.format(index)] = np.array(values, dtype=float).reshape(-1, 2)
+        return arrays
+
+    @staticmethod
+    def load(path):
+        """
+        :return: a dict of the checkpoint arrays
+        """
+        with np.load(path) as checkpoint:
+            return {key: checkpoint[key] for key in checkpoint.files}
+
+    @staticmethod
+    def restore(ga, checkpoint):
+        """
+        Restores a GA to the state of a checkpoint (see load). The GA continues from the generation after the
+        checkpoint generation
+        """
+        if not np.array_equal(checkpoint['interest_areas'], get_interest_areas_array(ga.interest_areas)):
+            raise ValueError('The checkpoint was created with different interest areas')
+
+        def get_population(prefix):
+            return {key[len(prefix):]: value for key, value in checkpoint.items() if key.startswith(prefix)}
+
+        ga.agents = unpack_population(ga.interest_areas, get_population('population_'))
+        ga.fittest_agent = unpack_population(ga.interest_areas, get_population('fittest_'))[0]
+        ga.start_generation = int(checkpoint['generation']) + 1
+        # the fitness cache is not checkpointed, so the hit rate of the resumed GA counts from its empty cache
+        ga.statistics.fitness_cache_lookups = (0, 0)
+        for index, name in enumerate(checkpoint['statistics_names']):
+            ga.statistics.statistics[str(name)] = [(int(gen), value) for gen, value in checkpoint['statistics_{}'.format(index)].tolist()]
+        ga.metrics.records = json.loads(str(checkpoint['metrics']))
+        gauss_next = float(checkpoint['python_random_gauss_next'])
+        random.setstate((int(checkpoint['python_random_version']), tuple(int(value) for value in checkpoint['python_random_state']),
+                         None if np.isnan(gauss_next) else gauss_next))
+        numpy_has_gauss, numpy_cached_gaussian = checkpoint['numpy_random_gauss']
+        np.random.set_state(('MT19937', checkpoint['numpy_random_keys'], int(checkpoint['numpy_random_position']),
+                             int(numpy_has_gauss), float(numpy_cached_gaussian)))
@@ -0,0 +1,58 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+
+class FitnessCache(object):
+    """
+    A bounded LRU cache of fitness values keyed by a fingerprint of the network geometry and the fitness function
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def get_key(network, fitness_function):
+        """
+        The fingerprint of a network is a digest of its sensors and relays locations in a canonical order
+        (by interest area index and then by location) so it does not depend on the order sensors were added in
+        :param network: an ADGN object
+        :param fitness_function: the fitness function
+        :return: a hashable key
+        """
+        sensors = network.sensors
+        size = len(sensors)
+        locations = sensors.locations[:size]
+        interest_area_indices = sensors.interest_area_indices[:size]
+        relays = sensors.relays[:size]
+        order = np.lexsort((locations[:, 1], locations[:, 0], interest_area_indices))
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(np.ascontiguousarray(locations[order]).tobytes())
+        digest.update(np.ascontiguousarray(relays[order]).tobytes())
+        return getattr(fitness_function, '__qualname__', repr(fitness_function)), digest.digest()
+
+    def get(self, key):
+        fitness = self.entries.get(key)
+        if fitness is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return fitness
+
+    def put(self, key, fitness):
+        self.entries[key] = fitness
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def get_hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0
@@ -5,9 +5,16 @@ import json
 import uuid
 import random
 
+import numpy as np
+
+from network.interest_areas import get_interest_areas_arrays
+from optimization.fitness_cache import FitnessCache
+from optimization.operators import CROSSOVERS, INTEREST_AREAS, breed_networks, mutate_locations
 from optimization.statistics import GAStatistics
-from geometry.shapes import Circle
+from optimization.termination import GENERATIONS
 from network.network import ADGN
+from utils import metrics
+from utils.metrics import MetricsRecorder
 from utils.utils import timer
 
 
@@ -37,18 +44,45 @@ class Agent(object):
 class GA(object):
 
     def __init__(self, interest_areas, initial_population_size, generations, fitness_function, optimum, mutation_factor=0.8,
-                 run_id=None):
+                 run_id=None, batch_evaluator=None, fitness_cache_size=1024, metrics_recorder=None, renderer=None,
+                 snapshot_log=None, checkpointer=None, record_snapshots=True, crossover=INTEREST_AREAS, mutation_sensors=1,
+                 mutation_step=0.5, termination=None):
+        """
+        :param crossover: the crossover of the sensors locations (see optimization.operators.get_crossover_masks)
+        :param mutation_sensors: the amount of sensors a mutation moves
+        :param mutation_step: the standard deviation of the mutation steps as a fraction of the interest areas radii
+        :param termination: (optional) stops the GA early and adapts its mutation and population size
+        (see optimization.termination.Termination)
+        """
+        if crossover not in CROSSOVERS:
+            raise ValueError('Unknown crossover {}. Please use one of {}'.format(crossover, CROSSOVERS))
+        if mutation_sensors < 1:
+            raise ValueError('A mutation should move at least one sensor')
         self.interest_areas = interest_areas
         self.initial_population_size = initial_population_size
+        self.population_size = initial_population_size
         self.fitness_function = fitness_function
         self.agents = None
         self.generations = generations
         self.mutation_factor = mutation_factor
+        self.crossover = crossover
+        self.mutation_sensors = mutation_sensors
+        self.initial_mutation_step = mutation_step
+        self.mutation_step = mutation_step
         self.statistics = GAStatistics(ga=self)
         self.fittest_agent = None
         self.initial_fittest = None
         self.run_id = run_id
         self.networks_for_visualization = []
+        self.renderer = renderer
+        self.snapshot_log = snapshot_log
+        self.checkpointer = checkpointer
+        self.termination = termination
+        self.record_snapshots = record_snapshots
+        self.start_generation = 1
+        self.batch_evaluator = batch_evaluator
+        self.fitness_cache = FitnessCache(maxsize=fitness_cache_size) if fitness_cache_size else None
+        self.metrics = metrics_recorder or MetricsRecorder(run_id=run_id)
 
         self.ga_steps = [
             ("calc fitness", self.calc_fitness),
@@ -59,102 +93,139 @@ class GA(object):
         self.optimum = optimum
 
     def generate_initial_population(self):
-        initial_agents = list()
-        for i in range(self.initial_population_size):
-            network = ADGN(interest_areas=self.interest_areas)
-            network.randomize()
-            agent = Agent(network=network)
-            _, agent.fitness = self.fitness_function(agent=agent)
-            initial_agents.append(agent)
-        self.agents = initial_agents
+        with self.metrics.measure('initial population', generation=0):
+            initial_agents = list()
+            for i in range(self.initial_population_size):
+                network = ADGN(interest_areas=self.interest_areas)
+                network.randomize()
+                initial_agents.append(Agent(network=network))
+            self.agents = initial_agents
+            self.calc_fitness()
 
     def evolve(self, logger):
-        self.initial_fittest = self.get_fittest()
-        self.networks_for_visualization = []
-        gen_image_path_format = '{}/snapshots/{}.png'
-        image = gen_image_path_format.format(self.run_id, 'initial')
-        self.networks_for_visualization.append((self.initial_fittest.network.as_json_dict(), 'Gen {}'.format('initial'), image))
-
-        for gen in range(1, self.generations):
-            start_ga = datetime.datetime.now()
-            logger.info("Generation: " + str(gen))
-            with timer("Generation {}".format(str(gen)), logger=logger):
-                for phase in self.ga_steps:
-                    with timer(phase[0], logger=logger):
-                        phase[1]()
-            gen_time = (datetime.datetime.now() - start_ga).total_seconds()
-            self.statistics.gen_snapshot(gen=gen, time_spent=gen_time)
-            image = gen_image_path_format.format(self.run_id, gen)
-            network_visualization_info = (self.get_fittest().network.as_json_dict(), 'Gen {}'.format(gen), image)
-            self.networks_for_visualization.append(network_visualization_info)
+        if self.start_generation == 1:
+            self.initial_fittest = self.get_fittest()
+            self.networks_for_visualization = []
+            self.add_snapshot(self.initial_fittest.network, gen=0, force=True)
+        else:
+            logger.info('Resuming from generation %s', self.start_generation)
+            if self.termination:
+                self.termination.adapt(self)
+
+        stop = (self.start_generation - 1, self.termination.get_stop_reason(self) if self.termination else None)
+        for gen in range(self.start_generation, self.generations):
+            if stop[1]:
+                break
+            self.evolve_generation(gen=gen, logger=logger)
+            self.add_snapshot(self.get_fittest().network, gen=gen)
+            stop = (gen, self.termination.update(self, gen=gen) if self.termination else None)
+            if self.checkpointer and not stop[1]:
+                self.checkpointer.checkpoint(self, generation=gen)
+        if stop[1]:
+            logger.info('Stopping after generation %s (%s)', *stop)
+            self.statistics.set_stop(*stop)
+        else:
+            self.statistics.set_stop(stop[0], GENERATIONS)
+        if self.checkpointer:
+            self.checkpointer.wait()
 
         logger.info('Adding relays')
-        self.add_relays()
+        with self.metrics.measure('relays', generation=self.generations):
+            self.add_relays()
         logger.info('Recalculating fitness')
-        self.calc_fitness()
-        image = gen_image_path_format.format(self.run_id, self.generations)
-        network_visualization_info = (self.get_fittest().network.as_json_dict(), 'Gen {}'.format(self.generations), image)
-        self.networks_for_visualization.append(network_visualization_info)
+        with self.metrics.measure('calc fitness', generation=self.generations):
+            self.calc_fitness()
+        self.add_snapshot(self.get_fittest().network, gen=self.generations, force=True)
         logger.info("Finished GA")
 
+    def add_snapshot(self, network, gen, force=False):
+        """
+        Records a snapshot of a network for the evolution visualization. With a renderer the snapshot is rendered
+        right away in the renderer pool. With a snapshot log it is appended to the log, otherwise it is kept in
+        memory until generate_evolution_visualization
+        :param force: keep the snapshot even if the renderer frame step skips its generation
+        """
+        if not self.record_snapshots:
+            return
+        if self.renderer:
+            self.renderer.submit(network, gen=gen, force=force)
+        if self.snapshot_log is not None:
+            self.snapshot_log.append(network, generation=gen)
+        elif not self.renderer:
+            image = '{}/snapshots/{}.png'.format(self.run_id, gen)
+            self.networks_for_visualization.append((network.as_json_dict(), 'Gen {}'.format(gen), image))
+
+    def evolve_generation(self, gen, logger):
+        start_ga = datetime.datetime.now()
+        logger.info("Generation: " + str(gen))
+        with timer("Generation {}".format(str(gen)), logger=logger), self.metrics.measure('generation', generation=gen):
+            for phase in self.ga_steps:
+                with timer(phase[0], logger=logger), self.metrics.measure(phase[0], generation=gen):
+                    phase[1]()
+        gen_time = (datetime.datetime.now() - start_ga).total_seconds()
+        self.statistics.gen_snapshot(gen=gen, time_spent=gen_time)
+
     def calc_fitness(self, *args, **kwargs):
+        pending_agents = list()
+        pending_keys = list()
+        for agent in self.agents:
+            if self.fitness_cache is None:
+                pending_agents.append(agent)
+                continue
+            key = self.fitness_cache.get_key(network=agent.network, fitness_function=self.fitness_function)
+            fitness = self.fitness_cache.get(key)
+            if fitness is None:
+                pending_agents.append(agent)
+                pending_keys.append(key)
+            else:
+                agent.fitness = fitness
+        fitnesses = self.evaluate_fitness(pending_agents) if pending_agents else []
+        metrics.count(metrics.FITNESS_EVALUATIONS, len(pending_agents))
+        for agent, fitness in zip(pending_agents, fitnesses):
+            agent.fitness = fitness
+        if self.fitness_cache is not None:
+            for key, fitness in zip(pending_keys, fitnesses):
+                self.fitness_cache.put(key, fitness)
         for agent in self.agents:
-            _, agent.fitness = self.fitness_function(agent=agent)
             self.fittest_agent = agent if self.fittest_agent is None or self.fittest_agent.fitness < agent.fitness else self.fittest_agent
 
+    def evaluate_fitness(self, agents):
+        """
+        :param agents: the agents to evaluate
+        :return: a list of the agents fitness values (in the same order)
+        """
+        if self.batch_evaluator:
+            return self.batch_evaluator.evaluate_networks([agent.network for agent in agents]).tolist()
+        return [self.fitness_function(agent=agent)[1] for agent in agents]
+
     def selection(self, *args, **kwargs):
         from analysis.fitness_functions import Optimum
         selected_agents = sorted(self.agents, key=lambda agent: agent.fitness, reverse=self.optimum == Optimum.MAX)
-        self.agents = selected_agents[:self.initial_population_size]
+        self.agents = selected_agents[:self.population_size]
 
     def breed(self, *args, **kwargs):
-        all_agents = list(self.agents)
-        offsprings = set()
-        while len(all_agents) > 1:
-
-            a1 = random.choice(all_agents)
-            all_agents.remove(a1)
-            a2 = random.choice(all_agents)
-            all_agents.remove(a2)
-
-            all_a1_nodes = list(a1.network.graph.vertices)
-            all_a2_nodes = list(a2.network.graph.vertices)
-
-            a1_nodes = set(random.choices(all_a1_nodes, k=random.randint(0, int(len(all_a1_nodes) / 2))))
-            compliment_in_a2 = set(node for node in filter(lambda n: n not in a1_nodes, all_a2_nodes))
-            a2_nodes = set(random.choices(all_a2_nodes, k=random.randint(0, int(len(all_a2_nodes) / 2))))
-            compliment_in_a1 = set(node for node in filter(lambda n: n not in a2_nodes, all_a1_nodes))
-
-            first_born_nodes = set(map(lambda n: n.clone(), a1_nodes.union(compliment_in_a2)))
-            first_born = ADGN(interest_areas=self.interest_areas, sensors=first_born_nodes)
-
-            second_born_nodes = set(map(lambda n: n.clone(), a2_nodes.union(compliment_in_a1)))
-            second_born = ADGN(interest_areas=self.interest_areas, sensors=second_born_nodes)
-            offsprings.add(Agent(network=first_born))
-            offsprings.add(Agent(network=second_born))
-        self.agents.extend(offsprings)
+        parents = list(self.agents)
+        random.shuffle(parents)
+        pairs = len(parents) // 2
+        offsprings = breed_networks(networks1=[agent.network for agent in parents[:2 * pairs:2]],
+                                    networks2=[agent.network for agent in parents[1:2 * pairs:2]],
+                                    interest_areas=self.interest_areas, crossover=self.crossover)
+        self.agents.extend(Agent(network=network) for network in offsprings)
 
     def mutate(self, *args, **kwargs):
-        for agent in self.agents:
-            network = agent.network
-            if random.random() <= self.mutation_factor:
-                random_node = network.get_random_sensor(include_relays=False)
-                network.move_sensor(random_node)
+        networks = [agent.network for agent in self.agents]
+        centers, radii = get_interest_areas_arrays(frozenset(self.interest_areas))
+        locations = np.stack([network.get_interest_areas_locations() for network in networks])
+        mutated_locations, moved = mutate_locations(locations, centers, radii, mutation_factor=self.mutation_factor,
+                                                    mutation_sensors=self.mutation_sensors, step_size=self.mutation_step)
+        for network, network_locations, network_moved in zip(networks, mutated_locations, moved):
+            interest_area_indices = np.flatnonzero(network_moved)
+            if len(interest_area_indices):
+                network.move_sensors(interest_area_indices, network_locations[interest_area_indices])
 
     def add_relays(self):
-        relevant_agents = set(filter(lambda t: len(t[1]) > 0, map(lambda agent: (agent, agent.network.get_intersecting_connectivity_components()), self.agents)))
-        while len(relevant_agents) > 0:
-            agent, ccs = relevant_agents.pop()
-            ccs = set(ccs)
-            network = agent.network
-            cc1, cc2 = ccs.pop()
-            halo_intersecting_circles = network.get_connectivity_components_halos_intersections(cc1=cc1, cc2=cc2)
-            intersecting_circles = random.choice(list(halo_intersecting_circles))
-            _, relay_location = Circle.get_point_in_intersection(intersecting_circles)
-            network.add_relay(location=relay_location)
-            new_intersecting_connectivity_components = network.get_intersecting_connectivity_components()
-            if new_intersecting_connectivity_components:
-                relevant_agents.add((agent, new_intersecting_connectivity_components))
+        for agent in self.agents:
+            agent.network.add_relays()
 
     def get_fittest(self):
         from analysis.fitness_functions import Optimum
@@ -168,13 +239,25 @@ class GA(object):
                 fittest = agent
         return fittest
 
+    def get_networks_for_visualization(self):
+        """
+        :return: a generator of (network, title, image path) of the recorded snapshots (see add_snapshot)
+        """
+        if self.snapshot_log is not None:
+            for index in range(len(self.snapshot_log)):
+                gen, network = self.snapshot_log.get_network(interest_areas=self.interest_areas, index=index)
+                yield network, 'Gen {}'.format(gen), '{}/snapshots/{}.png'.format(self.run_id, gen)
+        else:
+            for network_json, title, image in self.networks_for_visualization:
+                yield ADGN.from_json(network_json), title, image
+
     def generate_evolution_visualization(self, network_image_saver, output_dir):
-        if network_image_saver:
+        if self.renderer:
+            self.renderer.close()
+        elif network_image_saver:
             images_for_visualization = []
-            for network_visualization_info in self.networks_for_visualization:
-                network = ADGN.from_json(network_visualization_info[0])
-                title = network_visualization_info[1]
-                image_path = '{}/{}'.format(output_dir, network_visualization_info[2])
+            for network, title, image in self.get_networks_for_visualization():
+                image_path = '{}/{}'.format(output_dir, image)
                 network_image_saver(network, title, image_path)
                 images_for_visualization.append(imageio.imread(image_path))
             imageio.mimsave('{}/{}/network_evolution.gif'.format(output_dir, self.run_id), images_for_visualization,
@@ -182,48 +265,38 @@ class GA(object):
 
 
 class ParallelGA(GA):
+    """
+    A GA that computes fitness and adds relays on a process pool. The pool should be created with
+    optimization.parallel.create_pool so every worker holds the interest areas, networks are sent as packed arrays.
+    Breeding runs on the sensors locations arrays (see optimization.operators), which is cheaper than sending the
+    networks to the pool and back.
+    """
 
     def __init__(self, interest_areas, initial_population_size, generations, fitness_function, optimum, pool, mutation_factor=0.8,
-                 run_id=None):
+                 run_id=None, batch_evaluator=None, fitness_cache_size=1024, metrics_recorder=None, renderer=None,
+                 snapshot_log=None, checkpointer=None, record_snapshots=True, crossover=INTEREST_AREAS, mutation_sensors=1,
+                 mutation_step=0.5, termination=None):
 
         super(ParallelGA, self).__init__(interest_areas=interest_areas, initial_population_size=initial_population_size,
                                          generations=generations, fitness_function=fitness_function, optimum=optimum,
-                                         mutation_factor=mutation_factor, run_id=run_id)
+                                         mutation_factor=mutation_factor, run_id=run_id, batch_evaluator=batch_evaluator,
+                                         fitness_cache_size=fitness_cache_size, metrics_recorder=metrics_recorder,
+                                         renderer=renderer, snapshot_log=snapshot_log, checkpointer=checkpointer,
+                                         record_snapshots=record_snapshots, crossover=crossover,
+                                         mutation_sensors=mutation_sensors, mutation_step=mutation_step,
+                                         termination=termination)
         self.pool = pool
-        from optimization.parallel import breed_networks
-        self.parallel_breed = breed_networks
-        self.agent_mapping = dict()
-
-    def generate_initial_population(self):
-        super(ParallelGA, self).generate_initial_population()
-        self.agent_mapping = dict(map(lambda agent: (agent.agent_id, agent), self.agents))
-
-    def selection(self, *args, **kwargs):
-        super(ParallelGA, self).selection(*args, **kwargs)
-        self.agent_mapping = dict(map(lambda agent: (agent.agent_id, agent), self.agents))
+        from optimization.parallel import add_packed_network_relays, calc_packed_network_fitness
+        self.parallel_fitness = calc_packed_network_fitness
+        self.parallel_relays = add_packed_network_relays
 
-    def calc_fitness(self, *args, **kwargs):
-        for res in self.pool.map(self.fitness_function, self.agents):
-            agent = self.agent_mapping[res[0]]
-            agent.fitness = res[1]
-            self.fittest_agent = agent if self.fittest_agent is None or self.fittest_agent.fitness < agent.fitness else self.fittest_agent
+    def evaluate_fitness(self, agents):
+        if self.batch_evaluator:
+            return super(ParallelGA, self).evaluate_fitness(agents)
+        fitness_info = [(self.fitness_function, agent.agent_id, agent.network.pack()) for agent in agents]
+        return [res[1] for res in self.pool.starmap(self.parallel_fitness, fitness_info)]
 
-    def breed(self, *args, **kwargs):
-        all_agents = list(self.agents)
-        breeding_info = list()
-        while len(all_agents) > 1:
-            a1 = random.choice(all_agents)
-            all_agents.remove(a1)
-            a2 = random.choice(all_agents)
-            all_agents.remove(a2)
-            breeding_info.append((a1.network, a2.network, self.interest_areas))
-
-        offsprings = list()
-        for res in self.pool.starmap(self.parallel_breed, breeding_info):
-            agent1 = Agent(network=res[0])
-            agent2 = Agent(network=res[1])
-            self.agent_mapping[agent1.agent_id] = agent1
-            self.agent_mapping[agent2.agent_id] = agent2
-            offsprings.append(agent1)
-            offsprings.append(agent2)
-        self.agents.extend(offsprings)
+    def add_relays(self):
+        packed_networks = self.pool.map(self.parallel_relays, [agent.network.pack() for agent in self.agents])
+        for agent, packed_network in zip(self.agents, packed_networks):
+            agent.network = ADGN.unpack(interest_areas=self.interest_areas, packed=packed_network)
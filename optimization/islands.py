@@ -0,0 +1,204 @@
+import datetime
+import logging
+import random
+from multiprocessing import Pipe, Process
+
+import numpy as np
+
+from network.network import ADGN
+from optimization.ga import GA, Agent
+from optimization.operators import INTEREST_AREAS
+from optimization.termination import GENERATIONS
+from utils.utils import timer
+
+RING = 'ring'
+RANDOM = 'random'
+TOPOLOGIES = (RING, RANDOM)
+
+
+def pack_agents(agents):
+    """
+    :return: a list of (packed network, fitness) tuples (see ADGN.pack)
+    """
+    return [(agent.network.pack(), agent.fitness) for agent in agents]
+
+
+def unpack_agents(interest_areas, packed_agents):
+    """
+    :param interest_areas: the interest areas of the networks
+    :param packed_agents: a list of (packed network, fitness) tuples (see pack_agents)
+    :return: a list of Agent objects
+    """
+    agents = list()
+    for packed_network, fitness in packed_agents:
+        agent = Agent(network=ADGN.unpack(interest_areas=interest_areas, packed=packed_network))
+        agent.fitness = fitness
+        agents.append(agent)
+    return agents
+
+
+def run_island(connection, island, ga_info, logger_name):
+    """
+    The main loop of an island process. The island holds its own GA and waits for messages on the connection:
+    ('evolve', generations, migration size, immigrants) - the immigrants replace the worst agents, the GA evolves for
+    the given generations and the best agents (as many as the migration size) are sent back as emigrants.
+    ('finish',) - relays are added and the fittest agent is sent back with the island metrics records.
+    """
+    # forked islands start with the random state of the parent process
+    random.seed()
+    np.random.seed()
+    logger = logging.getLogger('{}.island-{}'.format(logger_name, island))
+    ga = GA(**ga_info)
+    ga.generate_initial_population()
+    gen = 1
+    while True:
+        message = connection.recv()
+        if message[0] == 'finish':
+            break
+        _, generations, migration_size, immigrants = message
+        if immigrants:
+            immigrants = unpack_agents(interest_areas=ga.interest_areas, packed_agents=immigrants[:len(ga.agents)])
+            ga.agents = ga.agents[:len(ga.agents) - len(immigrants)] + immigrants
+        for _ in range(generations):
+            ga.evolve_generation(gen=gen, logger=logger)
+            gen += 1
+        ga.calc_fitness()
+        ga.selection()
+        connection.send(pack_agents(ga.agents[:migration_size]))
+
+    with ga.metrics.measure('relays', generation=gen):
+        ga.add_relays()
+    with ga.metrics.measure('calc fitness', generation=gen):
+        ga.calc_fitness()
+    connection.send((pack_agents([ga.get_fittest()]), ga.metrics.records))
+    connection.close()
+
+
+class IslandGA(GA):
+    """
+    An island model GA. Every island is a process evolving its own GA sub population. Every migration interval
+    the best agents of every island migrate to a neighboring island (by a ring or a random topology) and replace its
+    worst agents. Only the migrants are sent between the processes.
+    """
+
+    def __init__(self, interest_areas, initial_population_size, generations, fitness_function, optimum, islands,
+                 migration_interval=10, migration_size=1, migration_topology=RING, mutation_factor=0.8, run_id=None,
+                 batch_evaluator=None, fitness_cache_size=1024, metrics_recorder=None, renderer=None, snapshot_log=None,
+                 crossover=INTEREST_AREAS, mutation_sensors=1, mutation_step=0.5):
+        """
+        :param initial_population_size: the population size of every island
+        :param islands: the amount of islands (processes)
+        :param migration_interval: the amount of generations between migrations
+        :param migration_size: the amount of agents every island sends on migration
+        :param migration_topology: ring (every island sends to the next one) or random
+        """
+        super(IslandGA, self).__init__(interest_areas=interest_areas, initial_population_size=initial_population_size,
+                                       generations=generations, fitness_function=fitness_function, optimum=optimum,
+                                       mutation_factor=mutation_factor, run_id=run_id, batch_evaluator=batch_evaluator,
+                                       fitness_cache_size=fitness_cache_size, metrics_recorder=metrics_recorder,
+                                       renderer=renderer, snapshot_log=snapshot_log, crossover=crossover,
+                                       mutation_sensors=mutation_sensors, mutation_step=mutation_step)
+        if islands < 1:
+            raise ValueError('An island GA needs at least one island')
+        if migration_interval < 1:
+            raise ValueError('The migration interval must be at least one generation')
+        if not 0 <= migration_size <= initial_population_size:
+            raise ValueError('The migration size must be between 0 and the population size')
+        if migration_topology not in TOPOLOGIES:
+            raise ValueError('Unknown migration topology {}. Please use one of {}'.format(migration_topology, TOPOLOGIES))
+        self.islands = islands
+        self.migration_interval = migration_interval
+        self.migration_size = migration_size
+        self.migration_topology = migration_topology
+        # every island keeps its own fitness cache
+        self.fitness_cache_size = fitness_cache_size
+        self.fitness_cache = None
+        self.processes = list()
+        self.connections = list()
+
+    def generate_initial_population(self, logger_name='AGDN'):
+        ga_info = dict(interest_areas=self.interest_areas, initial_population_size=self.initial_population_size,
+                       generations=self.generations, fitness_function=self.fitness_function, optimum=self.optimum,
+                       mutation_factor=self.mutation_factor, run_id=self.run_id, batch_evaluator=self.batch_evaluator,
+                       fitness_cache_size=self.fitness_cache_size, crossover=self.crossover,
+                       mutation_sensors=self.mutation_sensors, mutation_step=self.mutation_step)
+        self.agents = list()
+        for island in range(self.islands):
+            connection, island_connection = Pipe()
+            process = Process(target=run_island, args=(island_connection, island, ga_info, logger_name), daemon=True)
+            process.start()
+            # closing the parent copy of the island end makes recv fail instead of hanging if the island dies
+            island_connection.close()
+            self.processes.append(process)
+            self.connections.append(connection)
+
+    def get_migration_targets(self):
+        """
+        :return: a list holding the island every island sends its emigrants to
+        """
+        if self.islands == 1:
+            return [0]
+        if self.migration_topology == RING:
+            return [(island + 1) % self.islands for island in range(self.islands)]
+        return [random.choice([target for target in range(self.islands) if target != island]) for island in range(self.islands)]
+
+    def migrate(self, emigrants):
+        """
+        :param emigrants: a list with the packed emigrants of every island
+        :return: a list with the packed immigrants of every island
+        """
+        immigrants = [list() for _ in range(self.islands)]
+        if self.islands > 1:
+            for island, target in enumerate(self.get_migration_targets()):
+                immigrants[target].extend(emigrants[island])
+        return immigrants
+
+    def evolve(self, logger):
+        self.networks_for_visualization = []
+        immigrants = [list() for _ in range(self.islands)]
+        gen = 1
+        try:
+            while gen < self.generations:
+                generations = min(self.migration_interval, self.generations - gen)
+                last_gen = gen + generations - 1
+                start_ga = datetime.datetime.now()
+                logger.info("Islands generations: %s-%s", gen, last_gen)
+                with timer("Islands generations {}-{}".format(gen, last_gen), logger=logger), \
+                        self.metrics.measure('islands epoch', generation=last_gen):
+                    for connection, island_immigrants in zip(self.connections, immigrants):
+                        connection.send(('evolve', generations, max(self.migration_size, 1), island_immigrants))
+                    emigrants = [connection.recv() for connection in self.connections]
+                gen = last_gen + 1
+                self.agents = unpack_agents(interest_areas=self.interest_areas,
+                                            packed_agents=[packed_agent for island_emigrants in emigrants for packed_agent in island_emigrants])
+                self.fittest_agent = self.get_fittest()
+                if self.initial_fittest is None:
+                    self.initial_fittest = self.fittest_agent
+                gen_time = (datetime.datetime.now() - start_ga).total_seconds()
+                self.statistics.gen_snapshot(gen=last_gen, time_spent=gen_time)
+                self.add_snapshot(self.fittest_agent.network, gen=last_gen, force=True)
+                if self.migration_size:
+                    immigrants = self.migrate(emigrants)
+
+            logger.info('Adding relays')
+            with self.metrics.measure('islands relays', generation=self.generations):
+                for connection in self.connections:
+                    connection.send(('finish',))
+                results = [connection.recv() for connection in self.connections]
+        finally:
+            for connection in self.connections:
+                connection.close()
+            for process in self.processes:
+                process.join()
+            self.connections = list()
+            self.processes = list()
+
+        self.agents = unpack_agents(interest_areas=self.interest_areas, packed_agents=[result[0][0] for result in results])
+        self.fittest_agent = self.get_fittest()
+        for island, (_, records) in enumerate(results):
+            for record in records:
+                record['phase'] = 'island {} {}'.format(island, record['phase'])
+                self.metrics.records.append(record)
+        self.statistics.set_stop(self.generations - 1, GENERATIONS)
+        self.add_snapshot(self.fittest_agent.network, gen=self.generations, force=True)
+        logger.info("Finished GA")
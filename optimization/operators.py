@@ -0,0 +1,101 @@
+import numpy as np
+
+from geometry.kernels import get_pairs_across, project_into_circles
+from network.interest_areas import get_interest_areas_arrays
+from network.network import ADGN
+
+UNIFORM = 'uniform'
+ONE_POINT = 'one_point'
+INTEREST_AREAS = 'interest_areas'
+CROSSOVERS = (UNIFORM, ONE_POINT, INTEREST_AREAS)
+
+
+def get_crossover_masks(crossover, pairs, centers, random_state=np.random):
+    """
+    :param crossover: uniform (every interest area comes from either parent with the same probability), one_point
+    (a random line cuts the plane and every side comes from another parent) or interest_areas (a random subset of up
+    to half of the interest areas comes from the first parent, like the original GA crossover)
+    :param pairs: the amount of pairs of parents
+    :param centers: an array of shape (interest areas, 2) of the interest areas centers
+    :return: a boolean array of shape (pairs, interest areas) of the interest areas the first offspring of every pair
+    inherits from the first parent (the second offspring inherits the rest from the first parent)
+    """
+    if crossover not in CROSSOVERS:
+        raise ValueError('Unknown crossover {}. Please use one of {}'.format(crossover, CROSSOVERS))
+    amount = len(centers)
+    if crossover == UNIFORM:
+        return random_state.random_sample((pairs, amount)) < 0.5
+    if crossover == ONE_POINT:
+        angles = random_state.uniform(0, 2 * np.pi, size=pairs)
+        projections = np.asarray(centers, dtype=float) @ np.stack((np.cos(angles), np.sin(angles)))
+        cuts = random_state.uniform(projections.min(axis=0), projections.max(axis=0))
+        return (projections < cuts).T
+    ranks = random_state.random_sample((pairs, amount)).argsort(axis=1).argsort(axis=1)
+    return ranks < random_state.randint(0, amount // 2 + 1, size=pairs)[:, np.newaxis]
+
+
+def get_offspring_pairs(mask, pairs1, pairs2, locations, radius):
+    """
+    The pairs of sensors within the radius of an offspring. The pairs of sensors that were inherited from the same
+    parent are the parent pairs, so only the pairs across the two inherited blocks are searched for
+    :param mask: a boolean array of the interest areas inherited from the first parent
+    :param pairs1: the first parent pairs (see ADGN.get_interest_areas_pairs)
+    :param pairs2: the second parent pairs (see ADGN.get_interest_areas_pairs)
+    :param locations: an array of shape (interest areas, 2) of the offspring sensors locations
+    :param radius: the graph radius
+    :return: a tuple of two interest area index arrays of the offspring pairs
+    """
+    keep1 = mask[pairs1[0]] & mask[pairs1[1]]
+    keep2 = ~mask[pairs2[0]] & ~mask[pairs2[1]]
+    across = get_pairs_across(locations, mask, radius)
+    return (np.concatenate((pairs1[0][keep1], pairs2[0][keep2], across[0])),
+            np.concatenate((pairs1[1][keep1], pairs2[1][keep2], across[1])))
+
+
+def breed_networks(networks1, networks2, interest_areas, crossover=INTEREST_AREAS):
+    """
+    Crosses over every pair of networks on the sensors locations arrays (see get_crossover_masks) and builds the
+    offsprings graphs from the pairs of their parents (see get_offspring_pairs)
+    :param networks1: a list of the first parents (ADGN objects with a sensor in every interest area)
+    :param networks2: a list of the second parents
+    :param interest_areas: the interest areas of the networks
+    :param crossover: uniform, one_point or interest_areas
+    :return: a list of the offsprings (two for every pair)
+    """
+    if not networks1:
+        return []
+    centers, _ = get_interest_areas_arrays(frozenset(interest_areas))
+    masks = get_crossover_masks(crossover, len(networks1), centers)
+    offsprings = list()
+    for n1, n2, mask in zip(networks1, networks2, masks):
+        locations1 = n1.get_interest_areas_locations()
+        locations2 = n2.get_interest_areas_locations()
+        pairs1 = n1.get_interest_areas_pairs()
+        pairs2 = n2.get_interest_areas_pairs()
+        radius = n1.graph.radius
+        for offspring_mask in (mask, ~mask):
+            locations = np.where(offspring_mask[:, np.newaxis], locations1, locations2)
+            pairs = get_offspring_pairs(offspring_mask, pairs1, pairs2, locations, radius)
+            offsprings.append(ADGN.from_interest_areas_locations(interest_areas=interest_areas, locations=locations, pairs=pairs))
+    return offsprings
+
+
+def mutate_locations(locations, centers, radii, mutation_factor, mutation_sensors=1, step_size=0.5, random_state=np.random):
+    """
+    Every network is mutated with the probability mutation_factor. A mutation moves random sensors by gaussian steps
+    and projects them back into their interest areas
+    :param locations: an array of shape (networks, interest areas, 2) of the sensors locations
+    :param centers: an array of shape (interest areas, 2) of the interest areas centers
+    :param radii: an array of shape (interest areas,) of the interest areas radii
+    :param mutation_factor: the probability of a network to mutate
+    :param mutation_sensors: the amount of sensors a mutation moves
+    :param step_size: the standard deviation of the steps as a fraction of the interest areas radii
+    :return: a tuple (mutated locations, moved) where moved is a boolean array of shape (networks, interest areas)
+    """
+    networks, amount = locations.shape[:2]
+    mutated = random_state.random_sample(networks) <= mutation_factor
+    ranks = random_state.random_sample((networks, amount)).argsort(axis=1).argsort(axis=1)
+    moved = (ranks < mutation_sensors) & mutated[:, np.newaxis]
+    steps = random_state.normal(size=locations.shape) * (step_size * radii)[:, np.newaxis]
+    stepped = project_into_circles(locations + steps, centers, radii)
+    return np.where(moved[..., np.newaxis], stepped, locations), moved
@@ -1,19 +1,55 @@
-import random
-
 from network.network import ADGN
 
 
-def breed_networks(n1, n2, interest_areas):
-    n1_nodes = list(n1.graph.vertices)
-    n2_nodes = list(n2.graph.vertices)
+worker_interest_areas = None
+
+
+def init_worker(interest_areas):
+    """
+    Pool initializer. Loads the interest areas once per worker process so they are not sent with every task
+    """
+    global worker_interest_areas
+    worker_interest_areas = interest_areas
+
+
+def create_pool(interest_areas, processes=None):
+    """
+    :return: a multiprocessing Pool whose workers hold the interest areas (see init_worker)
+    """
+    from multiprocessing.pool import Pool
+    return Pool(processes=processes, initializer=init_worker, initargs=(interest_areas,))
+
+
+def calc_packed_network_fitness(fitness_function, agent_id, packed_network):
+    """
+    :param fitness_function: the fitness function
+    :param agent_id: the id of the evaluated agent
+    :param packed_network: a packed network (see ADGN.pack)
+    :return: a tuple (agent_id, fitness)
+    """
+    from optimization.ga import Agent
+    agent = Agent(network=ADGN.unpack(interest_areas=worker_interest_areas, packed=packed_network))
+    agent.agent_id = agent_id
+    return fitness_function(agent=agent)
+
+
+def add_packed_network_relays(packed_network):
+    """
+    :param packed_network: a packed network (see ADGN.pack)
+    :return: the packed network with its relays added (see ADGN.add_relays)
+    """
+    network = ADGN.unpack(interest_areas=worker_interest_areas, packed=packed_network)
+    network.add_relays()
+    return network.pack()
 
-    n1_partial_data = set(random.choices(n1_nodes, k=random.randint(0, int(len(n1_nodes) / 2))))
-    n2_compliment_data = set(node for node in filter(lambda n: n not in n1_partial_data, n2_nodes))
-    n2_partial_data = set(random.choices(n2_nodes, k=random.randint(0, int(len(n2_nodes) / 2))))
-    n1_compliment_data = set(node for node in filter(lambda n: n not in n2_partial_data, n1_nodes))
 
-    offspring1 = ADGN(interest_areas=interest_areas,
-                      sensors=set(map(lambda n: n.clone(), n1_partial_data.union(n2_compliment_data))))
-    offspring2 = ADGN(interest_areas=interest_areas,
-                      sensors=set(map(lambda n: n.clone(), n2_partial_data.union(n1_compliment_data))))
-    return offspring1, offspring2
+def render_packed_network(packed_network, title, path=None):
+    """
+    :param packed_network: a packed network (see ADGN.pack)
+    :param title: the image title
+    :param path: (optional) a path to also save the image to
+    :return: the rendered RGB image array (see utils.utils.render_network_image)
+    """
+    from utils.utils import render_network_image
+    network = ADGN.unpack(interest_areas=worker_interest_areas, packed=packed_network)
+    return render_network_image(network, title, path=path)
@@ -1,78 +1,177 @@
-import hashlib
-import uuid
-import itertools
+import datetime
+import math
+
 import numpy as np
-import pandas as pd
 
+from geometry.kernels import project_into_circles
+from network.interest_areas import get_interest_areas_arrays
 from network.network import ADGN
+from optimization.ga import Agent
+from optimization.statistics import GAStatistics
+from optimization.termination import GENERATIONS
+from utils import metrics
+from utils.metrics import MetricsRecorder
 from utils.utils import timer
 
-
-class Agent(object):
-
-    def __init__(self, network, fitness_function):
-        self.agent_id = hashlib.sha256(str(uuid.uuid4()).encode()).hexdigest()
-        self.network = network
-        self.fitness = fitness_function(self)[1]
+EXPONENTIAL = 'exponential'
+LINEAR = 'linear'
+LOGARITHMIC = 'logarithmic'
+COOLING_SCHEDULES = (EXPONENTIAL, LINEAR, LOGARITHMIC)
 
 
 class SGD(object):
+    """
+    A single solution simulated annealing optimizer. Every iteration perturbs all the sensors of the current network
+    at once by gaussian steps (relative to their interest areas radii), projects them back into their interest areas
+    and evaluates a batch of such candidates together. The best candidate replaces the current network if it is
+    fitter, and otherwise with the probability exp(-relative worsening / temperature), where the temperature follows
+    the cooling schedule. The fittest network seen is kept apart from the current network.
+    """
 
-    def __init__(self, run_id, interest_areas, fitness_function, optimum, iterations):
+    def __init__(self, run_id, interest_areas, fitness_function, optimum, iterations, metrics_recorder=None,
+                 batch_evaluator=None, batch_size=8, step_size=0.25, temperature=1.0, cooling_schedule=EXPONENTIAL,
+                 cooling_rate=0.99):
+        """
+        :param batch_evaluator: (optional) a BatchFitnessEvaluator to evaluate the candidates of every iteration with
+        :param batch_size: the amount of candidates of every iteration
+        :param step_size: the standard deviation of the sensors steps as a fraction of their interest areas radii
+        :param temperature: the initial temperature
+        :param cooling_schedule: exponential (temperature * cooling_rate ** iteration), linear (reaches 0 on the last
+        iteration) or logarithmic (temperature * log(2) / log(iteration + 2))
+        :param cooling_rate: the cooling rate of the exponential schedule
+        """
+        if batch_size < 1:
+            raise ValueError('The batch size must be at least 1')
+        if temperature < 0:
+            raise ValueError('The temperature must not be negative')
+        if cooling_schedule not in COOLING_SCHEDULES:
+            raise ValueError('Unknown cooling schedule {}. Please use one of {}'.format(cooling_schedule, COOLING_SCHEDULES))
         self.run_id = run_id
         self.interest_areas = interest_areas
         self.fitness_function = fitness_function
         self.optimum = optimum
         self.iterations = iterations
+        self.batch_evaluator = batch_evaluator
+        self.batch_size = batch_size
+        self.step_size = step_size
+        self.temperature = temperature
+        self.cooling_schedule = cooling_schedule
+        self.cooling_rate = cooling_rate
         self.phases = {
             'create_adversarial_network': self.create_adversarial_network,
+            'evaluate_adversarial_networks': self.evaluate_adversarial_networks,
             'change_network': self.change_network
         }
-        self.agent = Agent(network=ADGN(interest_areas=self.interest_areas), fitness_function=fitness_function)
-        self.agent.network.randomize()
-        self.statistics = None
+        self.statistics = GAStatistics(ga=self)
+        self.metrics = metrics_recorder or MetricsRecorder(run_id=run_id)
+
+        with self.metrics.measure('initial population', generation=0):
+            network = ADGN(interest_areas=self.interest_areas)
+            network.randomize()
+            self.agent = Agent(network=network)
+            self.agent.fitness = self.evaluate_networks([network])[0]
+        self.fittest_agent = self.agent
+        packed = network.pack()
+        self.ids, self.interest_area_indices, self.relays, self.halos = packed[0], packed[2], packed[3], packed[4]
+        centers, radii = get_interest_areas_arrays(frozenset(network.interest_areas))
+        self.centers = centers[self.interest_area_indices]
+        self.radii = radii[self.interest_area_indices]
+        self.accepted = 0
 
     def get_fittest(self):
-        return self.agent
+        return self.fittest_agent
 
     def generate_evolution_visualization(self, *args, **kwargs):
         pass
 
+    def get_temperature(self, iteration):
+        if self.cooling_schedule == EXPONENTIAL:
+            return self.temperature * self.cooling_rate ** iteration
+        if self.cooling_schedule == LINEAR:
+            return self.temperature * max(0.0, 1 - iteration / max(self.iterations - 1, 1))
+        return self.temperature * math.log(2) / math.log(iteration + 2)
+
+    def get_score(self, fitness):
+        """
+        :return: a score that is higher for fitter networks. With a minimum optimum a fitness of 0 (no paths at all)
+        is the worst score
+        """
+        from analysis.fitness_functions import Optimum
+        if self.optimum == Optimum.MAX:
+            return fitness
+        return -fitness if fitness > 0 else -math.inf
+
+    def evaluate_networks(self, networks):
+        metrics.count(metrics.FITNESS_EVALUATIONS, len(networks))
+        if self.batch_evaluator:
+            return [float(fitness) for fitness in self.batch_evaluator.evaluate_networks(networks)]
+        return [self.fitness_function(agent=Agent(network=network))[1] for network in networks]
+
     def evolve(self, logger):
         for iteration in range(self.iterations):
+            start = datetime.datetime.now()
             logger.info("Iteration %s", iteration)
             result = None
             for phase in self.phases:
                 name = phase
                 operation = self.phases[phase]
-                with timer(op_name=name, logger=logger):
-                    result = operation(result, logger)
+                with timer(op_name=name, logger=logger), self.metrics.measure(name, generation=iteration):
+                    result = operation(result, logger, iteration=iteration)
+            self.statistics.gen_snapshot(gen=iteration, time_spent=(datetime.datetime.now() - start).total_seconds())
+        self.statistics.set_stop(self.iterations - 1, GENERATIONS)
+        logger.info('Accepted %s of %s iterations', self.accepted, self.iterations)
+
+        logger.info('Adding relays')
+        with self.metrics.measure('relays', generation=self.iterations):
+            self.fittest_agent.network.add_relays()
+        with self.metrics.measure('calc fitness', generation=self.iterations):
+            self.fittest_agent.fitness = self.evaluate_networks([self.fittest_agent.network])[0]
+        logger.info("Finished SGD")
 
     def create_adversarial_network(self, result, logger, *args, **kwargs):
-        vertices = list(self.agent.network.graph.vertices)
-        df = pd.DataFrame([v.get('location') for v in vertices], index=[v.id for v in vertices], columns=['x', 'y'])
-        epsilon = np.random.uniform()
-        df['id'] = df.index
-        df['ia_radius'] = np.array([v.get('interest_area').radius for v in vertices])
-        df['ia_center-x'] = np.array([v.get('interest_area').center[0] for v in vertices])
-        df['ia_center-y'] = np.array([v.get('interest_area').center[1] for v in vertices])
-        df['new-x'] = df['x'] + np.random.uniform(size=len(self.agent.network.graph.vertices)) * epsilon
-        df['new-y'] = df['y'] + np.random.uniform(size=len(self.agent.network.graph.vertices)) * epsilon
-
-        def apply(data):
-            from network.interest_areas import InterestArea
-            ia = InterestArea(center=(data['ia_center-x'], data['ia_center-y']), radius=data['ia_radius'], name='dummy')
-            return ia.is_in_circle((data['new-x'], data['new-y']))
-
-        # df[df.apply(apply, axis=1)]
-        pass
+        """
+        :return: an array of shape (batch size, sensors, 2) of the candidates sensors locations
+        """
+        sensors = self.agent.network.sensors
+        locations = sensors.locations[:len(sensors)]
+        steps = np.random.normal(size=(self.batch_size,) + locations.shape) * (self.step_size * self.radii)[:, np.newaxis]
+        return project_into_circles(locations + steps, self.centers, self.radii)
+
+    def create_network(self, locations):
+        return ADGN.unpack(interest_areas=self.interest_areas,
+                           packed=(self.ids, locations, self.interest_area_indices, self.relays, self.halos))
 
-    def change_network(self, adversary_network, logger, *args, **kwargs):
-        adversary_agent = Agent(network=adversary_network, fitness_function=self.fitness_function)
+    def evaluate_adversarial_networks(self, candidates, logger, *args, **kwargs):
+        """
+        The batch evaluator evaluates the candidates locations directly, so only an accepted candidate gets a network
+        :return: a tuple (candidates locations, candidates fitness, candidates networks or None)
+        """
+        if self.batch_evaluator:
+            metrics.count(metrics.FITNESS_EVALUATIONS, len(candidates))
+            return candidates, [float(fitness) for fitness in self.batch_evaluator.evaluate(candidates)], None
+        networks = [self.create_network(locations) for locations in candidates]
+        return candidates, self.evaluate_networks(networks), networks
 
-        if adversary_agent.fitness > self.agent.fitness:
-            self.agent = adversary_agent
-        else:
-            probability = np.exp(1 * (adversary_agent.fitness - self.agent.fitness))
-            if np.random.uniform() < probability:
-                self.agent = adversary_agent
+    def change_network(self, evaluated_candidates, logger, iteration=0, *args, **kwargs):
+        """
+        Replaces the current network by the best candidate if it is fitter, and otherwise with the Metropolis
+        probability of the temperature of the iteration (see get_temperature)
+        :return: True if the candidate was accepted
+        """
+        candidates, fitnesses, networks = evaluated_candidates
+        scores = [self.get_score(fitness) for fitness in fitnesses]
+        best = int(np.argmax(scores))
+        current_score = self.get_score(self.agent.fitness)
+        accept = scores[best] >= current_score
+        if not accept and scores[best] > -math.inf:
+            temperature = self.get_temperature(iteration)
+            if temperature > 0:
+                worsening = (current_score - scores[best]) / max(abs(current_score), 1e-12)
+                accept = np.random.uniform() < math.exp(-worsening / temperature)
+        if accept:
+            self.agent = Agent(network=networks[best] if networks else self.create_network(candidates[best]))
+            self.agent.fitness = fitnesses[best]
+            self.accepted += 1
+            if scores[best] > self.get_score(self.fittest_agent.fitness):
+                self.fittest_agent = self.agent
+        return accept
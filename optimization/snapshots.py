@@ -0,0 +1,216 @@
+import mmap
+import os
+
+import numpy as np
+
+from network.network import ADGN
+
+MAGIC = b'ADGNSNP1'
+FILE_HEADER = np.dtype([('magic', 'S8'), ('interest_areas', '<i8')])
+RECORD_HEADER = np.dtype([('generation', '<i8'), ('flags', '<i8'), ('moved', '<i8'), ('relays', '<i8')])
+# a keyframe holds the locations of all the sensors and all the relays
+KEYFRAME = 1
+# the relays of the record replace the previous relays instead of being added to them
+RELAYS_RESET = 2
+
+
+class SnapshotLog(object):
+    """
+    An append only binary log of network snapshots (one per generation). Every record holds only the sensors that
+    moved and the relays that were added since the previous record, with a full keyframe every keyframe_interval
+    records. Sensors are identified by their interest area index, so a snapshot is an array of locations of shape
+    (interest areas, 2) (NaN for an interest area with no sensor) and an array of relays locations.
+    The file is memory mapped for reading, so any generation is reconstructed from its nearest keyframe.
+
+    File layout: a header (magic, interest areas amount) followed by records of a header
+    (generation, flags, moved amount, relays amount), the moved interest area indices (int64), the moved
+    locations (float64 pairs) and the relays locations (float64 pairs).
+    """
+
+    def __init__(self, path, keyframe_interval=100):
+        """
+        :param path: the log file path. an existing log is opened for appending
+        :param keyframe_interval: the amount of records between keyframes
+        """
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self.interest_areas_amount = None
+        self.offsets = list()
+        self.headers = list()
+        self.keyframes = list()
+        self.locations = None
+        self.relays = None
+        self.buffer = None
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self.scan()
+        self.file = open(path, 'ab')
+        if self.offsets:
+            _, self.locations, self.relays = self.get_state(len(self.offsets) - 1)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @property
+    def generations(self):
+        return [header[0] for header in self.headers]
+
+    def scan(self):
+        """
+        Reads all the records headers of the file. A partially written last record is truncated
+        """
+        with open(self.path, 'r+b') as file:
+            file_header = np.frombuffer(file.read(FILE_HEADER.itemsize), dtype=FILE_HEADER)
+            if len(file_header) == 0 or file_header['magic'][0] != MAGIC:
+                raise ValueError('{} is not a snapshot log'.format(self.path))
+            self.interest_areas_amount = int(file_header['interest_areas'][0])
+            length = os.path.getsize(self.path)
+            offset = FILE_HEADER.itemsize
+            while offset + RECORD_HEADER.itemsize <= length:
+                file.seek(offset)
+                header = tuple(int(value) for value in np.frombuffer(file.read(RECORD_HEADER.itemsize), dtype=RECORD_HEADER)[0])
+                size = RECORD_HEADER.itemsize + header[2] * 24 + header[3] * 16
+                if offset + size > length:
+                    break
+                if header[1] & KEYFRAME:
+                    self.keyframes.append(len(self.offsets))
+                self.offsets.append(offset)
+                self.headers.append(header)
+                offset += size
+            file.truncate(offset)
+
+    def discard_after(self, generation):
+        """
+        Truncates the log after the last record of a generation (used when resuming a run from a checkpoint)
+        """
+        generations = self.generations
+        index = len(generations)
+        while index and generations[index - 1] > generation:
+            index -= 1
+        if index == len(generations):
+            return
+        self.file.flush()
+        self.file.truncate(self.offsets[index])
+        self.buffer = None
+        del self.offsets[index:]
+        del self.headers[index:]
+        self.keyframes = [keyframe for keyframe in self.keyframes if keyframe < index]
+        if self.offsets:
+            _, self.locations, self.relays = self.get_state(len(self.offsets) - 1)
+        else:
+            self.locations = None
+            self.relays = None
+
+    @staticmethod
+    def get_network_state(network, interest_areas_amount):
+        """
+        :return: a tuple (locations, relays) of the sensors locations by interest area index and the relays locations
+        """
+        sensors = network.sensors
+        size = len(sensors)
+        interest_area_indices = sensors.interest_area_indices[:size]
+        relays_mask = sensors.relays[:size]
+        sensors_mask = ~relays_mask & (interest_area_indices >= 0)
+        locations = np.full(shape=(interest_areas_amount, 2), fill_value=np.nan, dtype=float)
+        locations[interest_area_indices[sensors_mask]] = sensors.locations[:size][sensors_mask]
+        return locations, sensors.locations[:size][relays_mask].copy()
+
+    def append(self, network, generation):
+        """
+        Appends a snapshot of a network
+        :param network: an ADGN object
+        :param generation: the generation of the snapshot
+        """
+        if self.interest_areas_amount is None:
+            self.interest_areas_amount = len(network.sensors.interest_areas)
+            self.file.write(np.array([(MAGIC, self.interest_areas_amount)], dtype=FILE_HEADER).tobytes())
+        locations, relays = self.get_network_state(network, self.interest_areas_amount)
+        flags = 0
+        if self.locations is None or len(self.offsets) % self.keyframe_interval == 0:
+            flags = KEYFRAME | RELAYS_RESET
+            moved = np.arange(self.interest_areas_amount)
+            added_relays = relays
+        else:
+            same = (locations == self.locations) | (np.isnan(locations) & np.isnan(self.locations))
+            moved = np.flatnonzero(~same.all(axis=1))
+            previous_relays = len(self.relays)
+            if len(relays) >= previous_relays and np.array_equal(relays[:previous_relays], self.relays):
+                added_relays = relays[previous_relays:]
+            else:
+                flags |= RELAYS_RESET
+                added_relays = relays
+        header = np.array([(generation, flags, len(moved), len(added_relays))], dtype=RECORD_HEADER)
+        offset = self.file.tell()
+        self.file.write(header.tobytes())
+        self.file.write(moved.astype('<i8').tobytes())
+        self.file.write(np.ascontiguousarray(locations[moved], dtype='<f8').tobytes())
+        self.file.write(np.ascontiguousarray(added_relays, dtype='<f8').tobytes())
+        self.file.flush()
+        if flags & KEYFRAME:
+            self.keyframes.append(len(self.offsets))
+        self.offsets.append(offset)
+        self.headers.append((generation, flags, len(moved), len(added_relays)))
+        self.locations = locations
+        self.relays = relays
+
+    def get_buffer(self, length):
+        """
+        :return: a memory map of the file of at least the given length
+        """
+        if self.buffer is None or len(self.buffer) < length:
+            self.file.flush()
+            # the previous map is closed once the arrays viewing it are released
+            with open(self.path, 'rb') as file:
+                self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.buffer
+
+    def get_record(self, index):
+        """
+        :return: a tuple (header, moved indices, moved locations, relays locations) of a record. The arrays are views
+        of the memory mapped file
+        """
+        header = self.headers[index]
+        _, _, moved_amount, relays_amount = header
+        offset = self.offsets[index] + RECORD_HEADER.itemsize
+        buffer = self.get_buffer(offset + moved_amount * 24 + relays_amount * 16)
+        moved = np.frombuffer(buffer, dtype='<i8', count=moved_amount, offset=offset)
+        offset += moved_amount * 8
+        locations = np.frombuffer(buffer, dtype='<f8', count=moved_amount * 2, offset=offset).reshape(-1, 2)
+        offset += moved_amount * 16
+        relays = np.frombuffer(buffer, dtype='<f8', count=relays_amount * 2, offset=offset).reshape(-1, 2)
+        return header, moved, locations, relays
+
+    def get_state(self, index):
+        """
+        Reconstructs a snapshot from its nearest keyframe
+        :param index: the record index
+        :return: a tuple (generation, locations, relays) (see get_network_state)
+        """
+        keyframe = self.keyframes[np.searchsorted(self.keyframes, index, side='right') - 1]
+        locations = np.full(shape=(self.interest_areas_amount, 2), fill_value=np.nan, dtype=float)
+        relays = np.zeros(shape=(0, 2), dtype=float)
+        for i in range(keyframe, index + 1):
+            header, moved, moved_locations, added_relays = self.get_record(i)
+            locations[moved] = moved_locations
+            relays = added_relays.copy() if header[1] & RELAYS_RESET else np.concatenate([relays, added_relays])
+        return self.headers[index][0], locations, relays
+
+    def get_network(self, interest_areas, index):
+        """
+        :param interest_areas: the interest areas of the logged networks
+        :param index: the record index
+        :return: a tuple (generation, ADGN object) of the snapshot
+        """
+        generation, locations, relays = self.get_state(index)
+        network = ADGN(interest_areas=interest_areas)
+        ordered_interest_areas = network.sensors.interest_areas
+        for interest_area_index in np.flatnonzero(~np.isnan(locations[:, 0])):
+            sensor = network.create_sensor(vertex_id=int(interest_area_index), location=tuple(locations[interest_area_index]),
+                                           interest_area=ordered_interest_areas[interest_area_index], is_relay=False)
+            network.graph.add_vertex(sensor)
+        for location in relays:
+            network.add_relay(location=tuple(location))
+        return generation, network
+
+    def close(self):
+        self.file.close()
+        self.buffer = None
@@ -6,14 +6,36 @@ class GAStatistics(object):
 
     GEN_FITNESS = 'Gen-Fitness'
     GEN_TIME = 'Gen-Time'
+    GEN_FITNESS_CACHE_HIT_RATE = 'Gen-Fitness-Cache-Hit-Rate'
+    GEN_MUTATION_STEP = 'Gen-Mutation-Step'
+    GEN_POPULATION_SIZE = 'Gen-Population-Size'
 
     def __init__(self, ga):
         self.ga = ga
         self.statistics = defaultdict(list)
+        self.fitness_cache_lookups = (0, 0)
+        self.stop = None
 
     def gen_snapshot(self, gen, time_spent):
         self.statistics[GAStatistics.GEN_FITNESS].append((gen, self.ga.get_fittest().fitness))
         self.statistics[GAStatistics.GEN_TIME].append((gen, time_spent))
+        fitness_cache = getattr(self.ga, 'fitness_cache', None)
+        if fitness_cache is not None:
+            hits = fitness_cache.hits - self.fitness_cache_lookups[0]
+            misses = fitness_cache.misses - self.fitness_cache_lookups[1]
+            self.fitness_cache_lookups = (fitness_cache.hits, fitness_cache.misses)
+            self.statistics[GAStatistics.GEN_FITNESS_CACHE_HIT_RATE].append((gen, hits / (hits + misses) if hits + misses else 0))
 
     def get(self, name):
         return self.statistics.get(name)
+
+    def add(self, name, gen, value):
+        self.statistics[name].append((gen, value))
+
+    def set_stop(self, gen, reason):
+        """
+        Records why the process stopped (see optimization.termination)
+        :param gen: the last generation that ran
+        :param reason: the stop reason
+        """
+        self.stop = (gen, reason)
@@ -0,0 +1,131 @@
+import csv
+import itertools
+import json
+import logging
+import random
+import time
+
+import numpy as np
+
+from utils import metrics
+
+SWEEP_PARAMETERS = ('seeds', 'fitness_functions', 'population_sizes', 'mutation_factors')
+RESULTS_FIELDS = ('run_id', 'seed', 'fitness_function', 'population_size', 'mutation_factor', 'iterations',
+                  'initial_fitness', 'fitness', 'seconds', 'connectivity_components_amount', 'size_of_largest_component',
+                  'relays', 'fitness_evaluations')
+
+
+def load_sweep(path):
+    """
+    A sweep spec is a json object holding the lists of values of every sweep parameter (see SWEEP_PARAMETERS), e.g.
+    {"seeds": [1, 2, 3], "fitness_functions": [1, 3], "population_sizes": [10, 20], "mutation_factors": [0.5, 1]}
+    and optionally the amount of "iterations" of every run. The values are checked up front (the fitness functions ids
+    should be known, the seeds and population sizes positive integers), so a bad value fails the sweep before any run
+    :return: the sweep spec dict
+    """
+    from analysis.fitness_functions import FitnessFunctions
+
+    with open(path, 'r') as sweep_file:
+        sweep = json.load(sweep_file)
+    if not isinstance(sweep, dict):
+        raise ValueError('The sweep spec {} should be a json object'.format(path))
+    for parameter in SWEEP_PARAMETERS:
+        values = sweep.get(parameter)
+        if not isinstance(values, list) or not values:
+            raise ValueError('The sweep spec {} needs a non empty list of {}'.format(path, parameter))
+    for fitness_function in sweep['fitness_functions']:
+        if isinstance(fitness_function, bool) or fitness_function not in FitnessFunctions.mapping:
+            raise ValueError('Unknown fitness function {} in the sweep spec {}'.format(fitness_function, path))
+    for parameter in ('seeds', 'population_sizes'):
+        for value in sweep[parameter]:
+            if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+                raise ValueError('The {} of the sweep spec {} should be positive integers, got {}'.format(parameter, path, value))
+    return sweep
+
+
+def get_sweep_jobs(sweep, sweep_id, iterations, evaluation_backend='objects', fitness_cache_size=1024):
+    """
+    :param sweep: a sweep spec (see load_sweep)
+    :param sweep_id: the id of the sweep, the prefix of all its runs ids
+    :param iterations: the amount of generations of every run, unless the spec sets its own
+    :return: a list with a job dict for every combination of the sweep parameters
+    """
+    iterations = sweep.get('iterations', iterations)
+    jobs = list()
+    for seed, fitness_function, population_size, mutation_factor in itertools.product(*(sweep[parameter] for parameter in SWEEP_PARAMETERS)):
+        jobs.append({
+            'run_id': '{}_{}_{}_{}_{}'.format(sweep_id, fitness_function, population_size, mutation_factor, seed),
+            'seed': seed,
+            'fitness_function': fitness_function,
+            'population_size': population_size,
+            'mutation_factor': mutation_factor,
+            'iterations': iterations,
+            'evaluation_backend': evaluation_backend,
+            'fitness_cache_size': fitness_cache_size,
+        })
+    return jobs
+
+
+def run_sweep_job(job):
+    """
+    Runs a single GA of a sweep in a pool worker created with optimization.parallel.create_pool, so the interest
+    areas loaded by the worker are shared by all the runs
+    :param job: a job dict (see get_sweep_jobs)
+    :return: a results dict (see RESULTS_FIELDS)
+    """
+    from analysis.batch_fitness import BatchFitnessEvaluator
+    from analysis.fitness_functions import FitnessFunctions
+    from optimization.ga import GA
+    from optimization.parallel import worker_interest_areas
+
+    random.seed(job['seed'])
+    np.random.seed(job['seed'])
+    logger = logging.getLogger('AGDN.sweep')
+    logger.setLevel(logging.WARNING)
+    start_counters = dict(metrics.counters)
+    start = time.perf_counter()
+    ga = GA(interest_areas=worker_interest_areas, initial_population_size=job['population_size'],
+            generations=job['iterations'], fitness_function=FitnessFunctions.get_fitness_function(job['fitness_function']),
+            optimum=FitnessFunctions.get_fitness_function_optimum(job['fitness_function']),
+            mutation_factor=job['mutation_factor'], run_id=job['run_id'],
+            batch_evaluator=BatchFitnessEvaluator(job['fitness_function']) if job['evaluation_backend'] == 'batch' else None,
+            fitness_cache_size=job['fitness_cache_size'], record_snapshots=False)
+    ga.generate_initial_population()
+    # the agents are mutated in place while evolving, so the initial fitness is kept before evolving
+    initial_fitness = ga.get_fittest().fitness
+    ga.evolve(logger=logger)
+    fittest_network = ga.get_fittest().network
+    components = fittest_network.graph.get_connectivity_components()
+    result = {key: job[key] for key in ('run_id', 'seed', 'fitness_function', 'population_size', 'mutation_factor', 'iterations')}
+    result.update({
+        'initial_fitness': initial_fitness,
+        'fitness': ga.get_fittest().fitness,
+        'seconds': time.perf_counter() - start,
+        'connectivity_components_amount': len(components),
+        'size_of_largest_component': max(len(cc) for cc in components),
+        'relays': len(fittest_network.relays),
+        'fitness_evaluations': metrics.counters[metrics.FITNESS_EVALUATIONS] - start_counters.get(metrics.FITNESS_EVALUATIONS, 0),
+    })
+    return result
+
+
+def run_sweep(pool, jobs, path, logger):
+    """
+    Runs the jobs of a sweep concurrently on a persistent pool. Every result is written to the results csv as soon as
+    its run finishes, so the results of a stopped sweep are kept
+    :param pool: a pool created with optimization.parallel.create_pool
+    :param jobs: a list of job dicts (see get_sweep_jobs)
+    :param path: the results csv path
+    :return: a list of the results dicts
+    """
+    results = list()
+    with open(path, 'w', newline='') as results_file:
+        writer = csv.DictWriter(results_file, fieldnames=RESULTS_FIELDS)
+        writer.writeheader()
+        for result in pool.imap_unordered(run_sweep_job, jobs):
+            writer.writerow(result)
+            results_file.flush()
+            results.append(result)
+            logger.info('finished run %s (%s/%s): fitness %s in %.2f seconds', result['run_id'], len(results), len(jobs),
+                        result['fitness'], result['seconds'])
+    return results
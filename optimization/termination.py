@@ -0,0 +1,109 @@
+from optimization.statistics import GAStatistics
+
+OPTIMUM = 'optimum'
+STAGNATION = 'stagnation'
+GENERATIONS = 'generations'
+STOP_REASONS = (OPTIMUM, STAGNATION, GENERATIONS)
+MAX_MUTATION_STEP_SCALE = 4
+
+
+class Termination(object):
+    """
+    Decides whether a GA stops before its last generation, and adapts the GA mutation and population size while it
+    runs. A GA stops once its fittest agent reaches the fitness bound of the interest areas (see
+    FitnessFunctions.get_fitness_function_bound), or after a window of generations without an improvement of the best
+    fitness. Every adaptation window without an improvement doubles the mutation step (up to MAX_MUTATION_STEP_SCALE
+    times the initial step) and grows the population by its initial size, an improvement resets both. Since every
+    agent may mutate, a larger population keeps more of the fittest networks around while the larger steps explore.
+    The state is derived from the fitness history in the GA statistics, so a GA resumed from a checkpoint continues
+    with the same mutation and population size.
+    """
+
+    def __init__(self, optimum, bound=None, stagnation_window=0, adaptation_window=0, tolerance=0.0, max_population_size=None):
+        """
+        :param optimum: Optimum.MIN or Optimum.MAX
+        :param bound: (optional) the best fitness any network can reach, the GA stops once its fittest agent reaches it
+        :param stagnation_window: the amount of generations without an improvement to stop after (0 never stops)
+        :param adaptation_window: the amount of generations without an improvement between adaptations (0 never adapts)
+        :param tolerance: the relative change of the best fitness that is not considered an improvement
+        :param max_population_size: (optional) the maximal population size of the adaptations. defaults to four times the
+        initial population size
+        """
+        if stagnation_window < 0 or adaptation_window < 0:
+            raise ValueError('The stagnation and adaptation windows should not be negative')
+        if tolerance < 0:
+            raise ValueError('Negative tolerance {}'.format(tolerance))
+        self.optimum = optimum
+        self.bound = bound
+        self.stagnation_window = stagnation_window
+        self.adaptation_window = adaptation_window
+        self.tolerance = tolerance
+        self.max_population_size = max_population_size
+        # the last (history length, best fitness, stagnation) so every generation only scans the new history
+        self.scanned = (0, None, 0)
+
+    def is_improvement(self, fitness, best):
+        from analysis.fitness_functions import Optimum
+        if self.optimum == Optimum.MIN and fitness <= 0:
+            # no paths at all
+            return False
+        if best is None:
+            return True
+        margin = self.tolerance * abs(best)
+        if self.optimum == Optimum.MAX:
+            return fitness > best + margin
+        return fitness < best - margin
+
+    def is_optimal(self, fitness):
+        from analysis.fitness_functions import Optimum
+        if self.bound is None:
+            return False
+        if self.optimum == Optimum.MAX:
+            return fitness >= self.bound
+        return 0 < fitness <= self.bound
+
+    def get_stagnation(self, statistics):
+        """
+        :return: the amount of generations since the best fitness last improved
+        """
+        history = statistics.get(GAStatistics.GEN_FITNESS) or []
+        length, best, stagnation = self.scanned
+        if length > len(history):
+            length, best, stagnation = 0, None, 0
+        for _, fitness in history[length:]:
+            if self.is_improvement(fitness, best):
+                best, stagnation = fitness, 0
+            else:
+                stagnation += 1
+        self.scanned = (len(history), best, stagnation)
+        return stagnation
+
+    def adapt(self, ga):
+        """
+        Sets the GA mutation step and population size of the current stagnation
+        """
+        level = self.get_stagnation(ga.statistics) // self.adaptation_window if self.adaptation_window else 0
+        max_population_size = self.max_population_size or 4 * ga.initial_population_size
+        ga.mutation_step = ga.initial_mutation_step * min(2 ** level, MAX_MUTATION_STEP_SCALE)
+        ga.population_size = max(min(ga.initial_population_size * (level + 1), max_population_size), ga.initial_population_size)
+
+    def get_stop_reason(self, ga):
+        """
+        :return: the reason the GA should stop, or None if it should go on
+        """
+        if self.is_optimal(ga.get_fittest().fitness):
+            return OPTIMUM
+        if self.stagnation_window and self.get_stagnation(ga.statistics) >= self.stagnation_window:
+            return STAGNATION
+        return None
+
+    def update(self, ga, gen):
+        """
+        Adapts the GA after a generation and records the adaptation in the GA statistics
+        :return: the reason the GA should stop, or None if it should go on
+        """
+        if self.adaptation_window:
+            self.adapt(ga)
+            ga.statistics.add(GAStatistics.GEN_MUTATION_STEP, gen=gen, value=ga.mutation_step)
+            ga.statistics.add(GAStatistics.GEN_POPULATION_SIZE, gen=gen, value=ga.population_size)
+        return self.get_stop_reason(ga)
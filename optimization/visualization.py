@@ -0,0 +1,55 @@
+from collections import deque
+
+import imageio
+
+from optimization.parallel import render_packed_network
+
+
+class EvolutionRenderer(object):
+    """
+    Renders the snapshots of an optimization process on a process pool while the process is still running.
+    Frames are rendered into memory and streamed, in order, into a gif or mp4 writer as soon as they are ready,
+    so only the frames still being rendered are held in memory.
+    The pool should be created with optimization.parallel.create_pool so every worker holds the interest areas.
+    """
+
+    def __init__(self, pool, path, frame_step=1, duration=0.2, snapshots_dir=None):
+        """
+        :param pool: the rendering process pool
+        :param path: the animation output path. mp4 paths need the imageio ffmpeg plugin, any other path is a gif
+        :param frame_step: render only every frame_step generation (the first and last snapshots are always rendered)
+        :param duration: the seconds every frame is shown
+        :param snapshots_dir: (optional) a directory to also save every frame to as a png
+        """
+        self.pool = pool
+        self.frame_step = frame_step
+        self.snapshots_dir = snapshots_dir
+        if path.endswith('.mp4'):
+            self.writer = imageio.get_writer(path, fps=1 / duration)
+        else:
+            self.writer = imageio.get_writer(path, mode='I', duration=duration)
+        self.pending = deque()
+
+    def submit(self, network, gen, force=False):
+        """
+        Queues the rendering of a snapshot of a network
+        :param network: the network to render
+        :param gen: the generation of the snapshot
+        :param force: render the snapshot even if the generation is skipped by the frame step
+        """
+        if not force and gen % self.frame_step:
+            return
+        path = '{}/{}.png'.format(self.snapshots_dir, gen) if self.snapshots_dir else None
+        self.pending.append(self.pool.apply_async(render_packed_network, (network.pack(), 'Gen {}'.format(gen), path)))
+        self.write_ready_frames()
+
+    def write_ready_frames(self, wait=False):
+        while self.pending and (wait or self.pending[0].ready()):
+            self.writer.append_data(self.pending.popleft().get())
+
+    def close(self):
+        """
+        Waits for all the queued snapshots and finalizes the animation file
+        """
+        self.write_ready_frames(wait=True)
+        self.writer.close()
@@ -0,0 +1,100 @@
+import csv
+import json
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+FITNESS_EVALUATIONS = 'fitness_evaluations'
+EDGES_BUILT = 'edges_built'
+BFS_RUNS = 'bfs_runs'
+COUNTERS = (FITNESS_EVALUATIONS, EDGES_BUILT, BFS_RUNS)
+
+# process wide operation counters. work done in pool workers is counted in the workers processes
+counters = Counter()
+
+
+def count(name, amount=1):
+    counters[name] += amount
+
+
+def get_peak_rss_kb():
+    """
+    :return: the peak resident set size of the process so far in KB (None where the resource module is not available)
+    """
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class MetricsRecorder(object):
+    """
+    Records the wall time, CPU time, peak memory and operation counters of every phase of an optimization process.
+    The peak traced memory is only recorded with trace_memory since tracemalloc slows the process down considerably.
+    The tracemalloc peak is never reset, so every phase keeps the running maximum of the traced memory at its own
+    and its nested phases boundaries, and takes the tracemalloc peak when it rose during the phase. The peak of a phase
+    that runs after a larger peak is therefore a lower bound.
+    """
+
+    FIELDS = ('run_id', 'generation', 'phase', 'wall_seconds', 'cpu_seconds', 'peak_rss_kb', 'peak_traced_bytes') + COUNTERS
+
+    def __init__(self, run_id=None, trace_memory=False):
+        self.run_id = run_id
+        self.trace_memory = trace_memory
+        self.records = list()
+        self.traced_peaks = list()
+
+    @contextmanager
+    def measure(self, phase, generation=None):
+        start_traced_peak = None
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            current, start_traced_peak = tracemalloc.get_traced_memory()
+            self.traced_peaks.append(current)
+        start_counters = dict(counters)
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield
+        finally:
+            peak_traced_bytes = None
+            if self.trace_memory:
+                current, traced_peak = tracemalloc.get_traced_memory()
+                peak_traced_bytes = max(self.traced_peaks.pop(), current)
+                if traced_peak > start_traced_peak:
+                    # the process peak so far was reached during this phase
+                    peak_traced_bytes = max(peak_traced_bytes, traced_peak)
+                if self.traced_peaks:
+                    self.traced_peaks[-1] = max(self.traced_peaks[-1], peak_traced_bytes)
+            record = {
+                'run_id': self.run_id,
+                'generation': generation,
+                'phase': phase,
+                'wall_seconds': time.perf_counter() - start_wall,
+                'cpu_seconds': time.process_time() - start_cpu,
+                'peak_rss_kb': get_peak_rss_kb(),
+                'peak_traced_bytes': peak_traced_bytes,
+            }
+            for name in COUNTERS:
+                record[name] = counters[name] - start_counters.get(name, 0)
+            self.records.append(record)
+
+    def save(self, path):
+        """
+        Writes the records as csv if the path ends with .csv and as json lines otherwise
+        :param path: the output file path
+        """
+        with open(path, 'w', newline='') as file:
+            if path.endswith('.csv'):
+                writer = csv.DictWriter(file, fieldnames=self.FIELDS)
+                writer.writeheader()
+                writer.writerows(self.records)
+            else:
+                for record in self.records:
+                    file.write(json.dumps(record) + '\n')
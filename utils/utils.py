@@ -5,6 +5,10 @@ from contextlib import contextmanager
 import matplotlib
 matplotlib.use('TkAgg')
 import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
 from matplotlib.patches import Circle as CircleUI
 from matplotlib.lines import Line2D
 
@@ -46,9 +50,7 @@ def plot_network(network, title, xlims, ylims):
     plt.show()
 
 
-def save_network_image(network, title, path):
-    fig = plt.figure()
-    ax = fig.gca()
+def draw_network(ax, network, title):
     for ia in network.interest_areas:
         color = 'blue' if not ia.is_hub else 'green'
         c = CircleUI((ia.center[0], ia.center[1]), ia.radius, facecolor=color, edgecolor='black')
@@ -69,20 +71,35 @@ def save_network_image(network, title, path):
             sensors_ys.append(sensor.get('location')[1])
     ax.scatter(sensors_xs, sensors_ys, s=5, c='red', alpha=1)
     ax.scatter(relays_xs, relays_ys, s=5, c='green', alpha=1)
-    for edge in network.graph.edges:
-        sensor1 = edge.v1
-        sensor2 = edge.v2
-        ui_line = Line2D([sensor1.get('location')[0], sensor2.get('location')[0]],
-                         [sensor1.get('location')[1], sensor2.get('location')[1]],
-                         linewidth=1, color='black')
-        ax.add_line(ui_line)
-
+    ax.add_collection(LineCollection([(edge.v1.get('location'), edge.v2.get('location')) for edge in network.graph.edges],
+                                     linewidths=1, colors='black'))
     ax.set_title(title)
+
+
+def save_network_image(network, title, path):
+    fig = plt.figure()
+    draw_network(fig.gca(), network, title)
     fig.savefig(path)
     plt.close(fig)
     plt.close('all')
 
 
+def render_network_image(network, title, path=None):
+    """
+    Renders a network into an in memory RGB image. Uses the Agg canvas directly so it is safe in worker processes
+    :param path: (optional) a path to also save the image to
+    :return: a uint8 array of shape (height, width, 3)
+    """
+    fig = Figure()
+    canvas = FigureCanvasAgg(fig)
+    draw_network(fig.add_subplot(111), network, title)
+    canvas.draw()
+    if path:
+        fig.savefig(path)
+    buffer, (width, height) = canvas.print_to_buffer()
+    return np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, 4)[:, :, :3].copy()
+
+
 def save_statistics(name, statistic, path, generate_ys=None):
     if statistic:
         fig = plt.figure(name)